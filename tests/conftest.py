@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,19 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_caches():
+    from core.test_runner import isolated_caches
+
+    with isolated_caches():
+        yield
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_media():
+    from core.test_runner import isolated_media
+
+    with isolated_media():
+        yield
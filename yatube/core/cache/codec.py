@@ -0,0 +1,31 @@
+import pickle
+import zlib
+
+# pickle начинается с b'\x80', поэтому префикс однозначно отличает сжатое
+# значение от несжатого, записанного раньше
+COMPRESSED = b'z'
+# быстрый уровень: страницы ленты сжимаются в разы уже на нём
+COMPRESS_LEVEL = 1
+
+
+def dumps(value, min_size=None):
+    '''
+    pickle значения; если он не меньше min_size байт, сжимается zlib.
+    Сжатый вариант берётся, только если он действительно короче.
+    '''
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if min_size is not None and len(data) >= min_size:
+        packed = COMPRESSED + zlib.compress(data, COMPRESS_LEVEL)
+        if len(packed) < len(data):
+            return packed
+    return data
+
+
+def loads(data):
+    if data[:1] == COMPRESSED:
+        data = zlib.decompress(data[1:])
+    return pickle.loads(data)
+
+
+def is_compressed(data):
+    return data[:1] == COMPRESSED
@@ -0,0 +1,249 @@
+import os
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import codec
+
+# sqlite ограничивает число параметров запроса
+MAX_PARAMS = 900
+INT64 = 2 ** 63
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+'''
+
+
+def _encode(value, min_size=None):
+    # целые храним как INTEGER, чтобы incr шёл одним UPDATE
+    if type(value) is int and -INT64 <= value < INT64:
+        return value
+    return sqlite3.Binary(codec.dumps(value, min_size))
+
+
+def _decode(raw):
+    if isinstance(raw, int):
+        return raw
+    return codec.loads(raw)
+
+
+class SQLiteCache(BaseCache):
+    '''
+    Кеш в файле sqlite в режиме WAL, общий для всех процессов-воркеров
+    на одной машине. LOCATION - путь к файлу. Читатели не блокируют
+    писателей, incr атомарен между процессами.
+
+    OPTIONS: MAX_ENTRIES и CULL_FREQUENCY как у стандартных бэкендов,
+    CULL_EVERY - раз в сколько записей процесс чистит просроченное,
+    COMPRESS_MIN_SIZE - с какого размера в байтах значения сжимаются.
+    '''
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        options = params.get('OPTIONS', {})
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._compress_min_size = options.get('COMPRESS_MIN_SIZE', 1024)
+        self._local = threading.local()
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            # после fork соединение родителя использовать нельзя
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+            local.writes = 0
+        return local.connection
+
+    def _encode(self, value):
+        return _encode(value, self._compress_min_size)
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _written(self, connection, count=1):
+        self._local.writes += count
+        if self._local.writes >= self._cull_every:
+            self._local.writes = 0
+            self._cull(connection)
+
+    def _cull(self, connection):
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        if not self._max_entries:
+            return
+        count, = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+            'ORDER BY expires IS NULL, expires LIMIT ?)',
+            (count // self._cull_frequency,),
+        )
+
+    def _make_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        key = self._make_key(key, version)
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return default if row is None else _decode(row[0])
+
+    def get_many(self, keys, version=None):
+        made = {self._make_key(key, version): key for key in keys}
+        made_keys = list(made)
+        connection = self._connection()
+        now = time.time()
+        result = {}
+        for start in range(0, len(made_keys), MAX_PARAMS):
+            chunk = made_keys[start:start + MAX_PARAMS]
+            rows = connection.execute(
+                'SELECT key, value FROM cache WHERE key IN ({}) '
+                'AND (expires IS NULL OR expires > ?)'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                (*chunk, now),
+            )
+            for made_key, raw in rows:
+                result[made[made_key]] = _decode(raw)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._make_key(key, version)
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, self._encode(value), self._expires(timeout)),
+        )
+        self._written(connection)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        rows = [
+            (self._make_key(key, version), self._encode(value), expires)
+            for key, value in data.items()
+        ]
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                rows,
+            )
+        self._written(connection, len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._make_key(key, version)
+        connection = self._connection()
+        cursor = connection.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires WHERE cache.expires <= ?',
+            (key, self._encode(value), self._expires(timeout), time.time()),
+        )
+        added = cursor.rowcount > 0
+        if added:
+            self._written(connection)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._make_key(key, version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self._make_key(key, version)
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            # BEGIN IMMEDIATE берёт блокировку записи сразу, поэтому
+            # чтение и запись нового значения атомарны между процессами
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = _decode(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._encode(value), key),
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._make_key(key, version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self._make_key(key, version)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        made_keys = [self._make_key(key, version) for key in keys]
+        connection = self._connection()
+        for start in range(0, len(made_keys), MAX_PARAMS):
+            chunk = made_keys[start:start + MAX_PARAMS]
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ({})'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                chunk,
+            )
+
+    def stats(self):
+        '''Число записей, их объём в байтах и сколько из них сжато.'''
+        row = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(value)), 0), "
+            "COALESCE(SUM(typeof(value) = 'blob' "
+            "AND substr(value, 1, 1) = ?), 0), "
+            "COALESCE(SUM(expires <= ?), 0) FROM cache",
+            (codec.COMPRESSED, time.time()),
+        ).fetchone()
+        return dict(zip(('entries', 'bytes', 'compressed', 'expired'), row))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # соединение живёт весь срок процесса: переоткрывать его на каждый
+        # запрос дороже, чем держать
+        pass
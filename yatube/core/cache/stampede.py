@@ -0,0 +1,99 @@
+import math
+import random
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+LOCK_KEY = 'stampede-lock:{}'
+POLL_INTERVAL = 0.05
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _should_refresh_early(expires, delta, beta, now):
+    '''
+    Вероятностное раннее обновление: чем дольше пересчёт (delta) и чем
+    ближе срок, тем вероятнее, что запрос возьмётся за пересчёт до
+    истечения, пока остальные ещё получают готовое значение.
+    '''
+    return now - delta * beta * math.log(1 - random.random()) >= expires
+
+
+def _acquire(key, lock_timeout, cache):
+    token = secrets.token_hex(8)
+    if cache.add(LOCK_KEY.format(key), token, lock_timeout):
+        return token
+    return None
+
+
+def _release(key, token, cache):
+    lock_key = LOCK_KEY.format(key)
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _wait_for(key, lock_timeout, cache):
+    '''Ждёт, пока владелец блокировки положит значение.'''
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if not cache.has_key(LOCK_KEY.format(key)):
+            break
+    return None
+
+
+def get_or_compute(key, compute, timeout, version=None, cacheable=None,
+                   grace=None, lock_timeout=None, beta=None, cache=None):
+    '''
+    Возвращает значение из кеша или вычисляет его через compute(),
+    не допуская, чтобы одно значение пересчитывали сразу все процессы.
+
+    Значение хранится timeout + grace секунд вместе с version. После
+    timeout, при другой version или при раннем обновлении пересчитывает
+    только владелец блокировки, остальные в это время получают прежнее
+    значение. Если значения нет совсем, остальные ждут владельца не
+    дольше lock_timeout. cacheable(value) позволяет не сохранять
+    результат (например, ответ с ошибкой).
+    '''
+    cache = cache or default_cache
+    grace = _setting('CACHE_GRACE_TIME', 60) if grace is None else grace
+    if lock_timeout is None:
+        lock_timeout = _setting('CACHE_LOCK_TIMEOUT', 10)
+    beta = _setting('CACHE_EARLY_REFRESH_BETA', 1.0) if beta is None else beta
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, entry_version, expires, delta = entry
+        if entry_version == version and not _should_refresh_early(
+            expires, delta, beta, time.time()
+        ):
+            return value
+        token = _acquire(key, lock_timeout, cache)
+        if token is None:
+            return value
+    else:
+        token = _acquire(key, lock_timeout, cache)
+        if token is None:
+            entry = _wait_for(key, lock_timeout, cache)
+            if entry is not None:
+                return entry[0]
+    try:
+        started = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - started
+        if cacheable is None or cacheable(value):
+            cache.set(
+                key, (value, version, time.time() + timeout, delta),
+                timeout + grace,
+            )
+    finally:
+        if token is not None:
+            _release(key, token, cache)
+    return value
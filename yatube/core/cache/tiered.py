@@ -0,0 +1,294 @@
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import codec
+
+# неизменяемые значения храним в L1 как есть, остальное копией-pickle:
+# вызывающий код может менять полученный объект (например, заголовки
+# закешированного HttpResponse)
+IMMUTABLE = (int, float, str, bytes, bool, type(None))
+STAMP_PREFIX = 'l1v:'
+STATS_INDEX_KEY = 'l1-stats'
+STATS_KEY = 'l1-stats:{}'
+COUNTERS = ('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses', 'l1_evictions')
+
+# L1 общий для потоков процесса: django создаёт экземпляр бэкенда
+# на каждый поток
+_stores = {}
+_locks = {}
+_stats = {}
+_published = {}
+
+
+def _stamp_key(key):
+    return STAMP_PREFIX + key
+
+
+class TieredCache(BaseCache):
+    '''
+    Двухуровневый кеш: маленький LRU в памяти процесса (L1) перед общим
+    кешем (L2), алиас которого задаётся в LOCATION.
+
+    Каждое значение пишется в L2 вместе с меткой записи. Запись L1 без
+    проверки отдаётся не дольше L1_MAX_AGE секунд, после чего сверяется
+    её метка с меткой в L2 - это один маленький ключ вместо всего
+    значения. Поэтому запись L1 переживает изменение или удаление ключа
+    в другом процессе не больше чем на L1_MAX_AGE.
+
+    L1 ограничен и числом записей, и объёмом в байтах; значения больше
+    COMPRESS_MIN_SIZE хранятся сжатыми (core.cache.codec).
+
+    OPTIONS: L1_MAX_ENTRIES и L1_MAX_BYTES - размер L1, L1_MAX_AGE -
+    граница устаревания в секундах, COMPRESS_MIN_SIZE - порог сжатия,
+    STATS_INTERVAL - как часто процесс публикует свою статистику в L2,
+    откуда её читает команда cache_stats.
+    '''
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._alias = location
+        options = params.get('OPTIONS', {})
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_max_bytes = int(options.get('L1_MAX_BYTES', 16 * 2 ** 20))
+        self._l1_max_age = float(options.get('L1_MAX_AGE', 1))
+        self._compress_min_size = options.get('COMPRESS_MIN_SIZE', 1024)
+        self._stats_interval = float(options.get('STATS_INTERVAL', 10))
+        self._l1 = _stores.setdefault(location, OrderedDict())
+        self._lock = _locks.setdefault(location, threading.Lock())
+        self._stats = _stats.setdefault(location, Counter())
+
+    @property
+    def l2(self):
+        return caches[self._alias]
+
+    def stats(self):
+        '''Счётчики попаданий по уровням и занятая L1 память.'''
+        with self._lock:
+            stats = {name: self._stats[name] for name in COUNTERS}
+            stats['l1_entries'] = len(self._l1)
+            stats['l1_bytes'] = self._stats['l1_bytes']
+            stats['l1_compressed'] = sum(
+                1 for (pickled, data), *_ in self._l1.values()
+                if pickled and codec.is_compressed(data)
+            )
+        return stats
+
+    def process_stats(self):
+        '''Статистика, опубликованная процессами: {процесс: stats()}.'''
+        names = self.l2.get(STATS_INDEX_KEY) or {}
+        found = self.l2.get_many([STATS_KEY.format(name) for name in names])
+        return {
+            name: found[STATS_KEY.format(name)] for name in sorted(names)
+            if STATS_KEY.format(name) in found
+        }
+
+    def _publish_stats(self, now):
+        if _published.get(self._alias, 0) > now:
+            return
+        _published[self._alias] = now + self._stats_interval
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        ttl = self._stats_interval * 3
+        self.l2.set(STATS_KEY.format(name), self.stats(), ttl)
+        # гонка при обновлении индекса лишь пропустит процесс до его
+        # следующей публикации
+        names = {
+            other: seen
+            for other, seen in (self.l2.get(STATS_INDEX_KEY) or {}).items()
+            if seen > now - ttl
+        }
+        names[name] = now
+        self.l2.set(STATS_INDEX_KEY, names, None)
+
+    def _l1_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _remember(self, l1_key, value, stamp, timeout=DEFAULT_TIMEOUT):
+        if stamp is None:
+            # без метки нельзя проверить свежесть, такое значение не
+            # кладём в L1
+            self._forget(l1_key)
+            return
+        if isinstance(value, IMMUTABLE):
+            payload = (False, value)
+            size = sys.getsizeof(value)
+        else:
+            data = codec.dumps(value, self._compress_min_size)
+            payload = (True, data)
+            size = len(data)
+        if size > self._l1_max_bytes:
+            self._forget(l1_key)
+            return
+        now = time.time()
+        expires = None
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            expires = now + timeout
+        with self._lock:
+            self._drop(l1_key)
+            self._l1[l1_key] = [
+                payload, stamp, now + self._l1_max_age, expires, size,
+            ]
+            self._stats['l1_bytes'] += size
+            while (
+                len(self._l1) > self._l1_max_entries
+                or self._stats['l1_bytes'] > self._l1_max_bytes
+            ):
+                self._drop(next(iter(self._l1)))
+                self._stats['l1_evictions'] += 1
+
+    def _drop(self, l1_key):
+        # вызывается под self._lock
+        entry = self._l1.pop(l1_key, None)
+        if entry is not None:
+            self._stats['l1_bytes'] -= entry[4]
+
+    def _forget(self, *l1_keys):
+        with self._lock:
+            for l1_key in l1_keys:
+                self._drop(l1_key)
+
+    def _lookup(self, l1_key, now):
+        '''(значение, None) для свежей записи, (None, метка) для записи,
+        которую надо сверить с L2, (None, None) для промаха.'''
+        entry = self._l1.get(l1_key)
+        if entry is None:
+            return None, None
+        payload, stamp, check_at, expires, size = entry
+        if expires is not None and expires <= now:
+            self._drop(l1_key)
+            return None, None
+        if check_at <= now:
+            return None, stamp
+        self._l1.move_to_end(l1_key)
+        return payload, None
+
+    @staticmethod
+    def _load(payload):
+        pickled, value = payload
+        return codec.loads(value) if pickled else value
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        l1_keys = {key: self._l1_key(key, version) for key in keys}
+        now = time.time()
+        result = {}
+        to_check = {}
+        with self._lock:
+            for key in keys:
+                payload, stamp = self._lookup(l1_keys[key], now)
+                if payload is not None:
+                    result[key] = payload
+                elif stamp is not None:
+                    to_check[key] = stamp
+        if to_check:
+            # одна пачка маленьких меток вместо значений
+            stamps = self.l2.get_many(
+                [_stamp_key(key) for key in to_check], version=version
+            )
+            with self._lock:
+                for key, stamp in to_check.items():
+                    entry = self._l1.get(l1_keys[key])
+                    if (
+                        entry is not None and entry[1] == stamp
+                        and stamps.get(_stamp_key(key)) == stamp
+                    ):
+                        entry[2] = now + self._l1_max_age
+                        result[key] = entry[0]
+        hits = len(result)
+        missing = [key for key in keys if key not in result]
+        result = {key: self._load(payload) for key, payload in result.items()}
+        if missing:
+            wanted = missing + [_stamp_key(key) for key in missing]
+            found = self.l2.get_many(wanted, version=version)
+            for key in missing:
+                if key in found:
+                    result[key] = found[key]
+                    self._remember(
+                        l1_keys[key], found[key], found.get(_stamp_key(key))
+                    )
+                else:
+                    self._forget(l1_keys[key])
+        with self._lock:
+            self._stats['l1_hits'] += hits
+            self._stats['l1_misses'] += len(missing)
+            self._stats['l2_hits'] += len(result) - hits
+            self._stats['l2_misses'] += len(keys) - len(result)
+        self._publish_stats(now)
+        return result
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        stamps = {key: secrets.randbits(63) for key in data}
+        values = dict(data)
+        values.update(
+            (_stamp_key(key), stamp) for key, stamp in stamps.items()
+        )
+        failed = self.l2.set_many(values, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key in failed:
+                self._forget(self._l1_key(key, version))
+            else:
+                self._remember(
+                    self._l1_key(key, version), value, stamps[key], timeout
+                )
+        return [key for key in data if key in failed]
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self.l2.add(key, value, timeout=timeout, version=version):
+            return False
+        stamp = secrets.randbits(63)
+        self.l2.set(_stamp_key(key), stamp, timeout=timeout, version=version)
+        self._remember(self._l1_key(key, version), value, stamp, timeout)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        try:
+            value = self.l2.incr(key, delta, version=version)
+        except ValueError:
+            self._forget(self._l1_key(key, version))
+            raise
+        stamp = secrets.randbits(63)
+        # срок жизни L2 неизвестен, метка живёт без срока: лишняя метка
+        # лишь заставит перечитать значение
+        self.l2.set(_stamp_key(key), stamp, timeout=None, version=version)
+        self._remember(self._l1_key(key, version), value, stamp)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.touch(_stamp_key(key), timeout=timeout, version=version)
+        touched = self.l2.touch(key, timeout=timeout, version=version)
+        self._forget(self._l1_key(key, version))
+        return touched
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l2.delete_many(
+            keys + [_stamp_key(key) for key in keys], version=version
+        )
+        self._forget(*(self._l1_key(key, version) for key in keys))
+
+    def clear(self):
+        self.l2.clear()
+        with self._lock:
+            self._l1.clear()
+            self._stats['l1_bytes'] = 0
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache.sqlite import SQLiteCache
+
+BACKENDS = {
+    'locmem': LocMemCache,
+    'file': FileBasedCache,
+    'sqlite': SQLiteCache,
+}
+COUNTER_KEY = 'bench-counter'
+
+
+def run_worker(args):
+    '''Нагрузка одного процесса: чтения пачками, записи и incr.'''
+    name, location, seed, options = args
+    cache = BACKENDS[name](location, {
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2},
+    })
+    rng = random.Random(seed)
+    keys = [f'bench:{i}' for i in range(options['keys'])]
+    value = 'x' * options['value_size']
+    hits = lookups = increments = 0
+    cache.add(COUNTER_KEY, 0)
+    started = time.perf_counter()
+    for _ in range(options['ops']):
+        roll = rng.random()
+        if roll < options['write_ratio']:
+            cache.set(rng.choice(keys), value)
+        elif roll < options['write_ratio'] + 0.05:
+            cache.incr(COUNTER_KEY)
+            increments += 1
+        else:
+            batch = rng.sample(keys, options['batch'])
+            hits += len(cache.get_many(batch))
+            lookups += len(batch)
+    elapsed = time.perf_counter() - started
+    return elapsed, hits, lookups, increments
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кеша при нескольких процессах: пропускную '
+        'способность, долю попаданий в ключи, записанные другими '
+        'процессами, и потерянные incr.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--ops', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--batch', type=int, default=10)
+        parser.add_argument('--value-size', type=int, default=1024)
+        parser.add_argument('--write-ratio', type=float, default=0.1)
+        parser.add_argument(
+            '--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS)
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        context = multiprocessing.get_context('fork')
+        for name in options['backends']:
+            tmp = tempfile.mkdtemp(prefix='bench-cache-')
+            location = (
+                os.path.join(tmp, 'cache.sqlite3') if name == 'sqlite'
+                else tmp
+            )
+            try:
+                with context.Pool(workers) as pool:
+                    started = time.perf_counter()
+                    results = pool.map(run_worker, [
+                        (name, location, seed, options)
+                        for seed in range(workers)
+                    ])
+                    wall = time.perf_counter() - started
+                # итог счётчика из нового процесса: у locmem его нет
+                counter = BACKENDS[name](location, {}).get(COUNTER_KEY)
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+            ops = workers * options['ops']
+            hits = sum(result[1] for result in results)
+            lookups = sum(result[2] for result in results)
+            increments = sum(result[3] for result in results)
+            self.stdout.write(
+                f'{name:>7}: {ops / wall:,.0f} оп/с, '
+                f'попаданий {hits / max(lookups, 1):.1%}, '
+                f'incr {counter if counter is not None else "-"}'
+                f'/{increments}'
+            )
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from core.cache.tiered import COUNTERS
+
+
+def ratio(hits, total):
+    return f'{hits / total:.1%}' if total else '-'
+
+
+def size(value):
+    for unit in ('Б', 'КБ', 'МБ'):
+        if value < 1024:
+            return f'{value:.0f} {unit}'
+        value /= 1024
+    return f'{value:.1f} ГБ'
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает долю попаданий и занятую память кешей: L1 каждого '
+        'процесса (по опубликованной ими статистике) и общий L2.'
+    )
+
+    def handle(self, *args, **options):
+        for alias in settings.CACHES:
+            backend = caches[alias]
+            if hasattr(backend, 'process_stats'):
+                self.show_tiered(alias, backend.process_stats())
+            elif hasattr(backend, 'stats'):
+                stats = backend.stats()
+                self.stdout.write(
+                    f'{alias}: записей {stats["entries"]}, '
+                    f'{size(stats["bytes"])}, сжато {stats["compressed"]}, '
+                    f'просрочено {stats["expired"]}'
+                )
+
+    def show_tiered(self, alias, processes):
+        total = dict.fromkeys(COUNTERS + ('l1_entries', 'l1_bytes'), 0)
+        for name, stats in processes.items():
+            self.stdout.write(f'{alias} {name}: ' + self.describe(stats))
+            for key in total:
+                total[key] += stats.get(key, 0)
+        self.stdout.write(
+            f'{alias} всего ({len(processes)} проц.): '
+            + self.describe(total)
+        )
+
+    @staticmethod
+    def describe(stats):
+        lookups = stats['l1_hits'] + stats['l1_misses']
+        return (
+            f'L1 {ratio(stats["l1_hits"], lookups)}, '
+            f'L1+L2 {ratio(stats["l1_hits"] + stats["l2_hits"], lookups)}, '
+            f'L1 записей {stats["l1_entries"]}, '
+            f'{size(stats["l1_bytes"])}, '
+            f'вытеснено {stats["l1_evictions"]}'
+        )
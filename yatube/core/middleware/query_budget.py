@@ -0,0 +1,106 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.query_budget')
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )*%s\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries=None, time_ms=None):
+    '''
+    Задаёт бюджет запросов к БД для view. Бюджет из
+    settings.QUERY_BUDGETS для того же имени view важнее декоратора.
+    '''
+    def decorator(view_func):
+        view_func.query_budget = {'queries': queries, 'time_ms': time_ms}
+        return view_func
+    return decorator
+
+
+def fingerprint(sql):
+    '''SQL без конкретных значений: одинаковые запросы с разными
+    параметрами получают один отпечаток.'''
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return LITERAL_RE.sub('?', sql)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.queries.append(sql)
+
+    def duplicates(self):
+        counter = Counter(fingerprint(sql) for sql in self.queries)
+        return [(sql, n) for sql, n in counter.most_common() if n > 1]
+
+
+class QueryBudgetMiddleware:
+    '''
+    Считает запросы и время БД на каждый запрос через execute_wrapper
+    (работает и при DEBUG=False) и сверяет их с бюджетом view.
+    Превышение пишется в лог core.query_budget вместе с повторяющимися
+    запросами, а при QUERY_BUDGET_RAISE=True выбрасывает исключение.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request.query_budget = None
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        if request.query_budget:
+            self.check(request, request.query_budget, recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        view_name = request.resolver_match.view_name
+        request.query_budget = budgets.get(view_name) or getattr(
+            view_func, 'query_budget', None
+        )
+
+    def check(self, request, budget, recorder):
+        problems = []
+        limit = budget.get('queries')
+        if limit is not None and len(recorder.queries) > limit:
+            problems.append(f'запросов {len(recorder.queries)} > {limit}')
+        limit = budget.get('time_ms')
+        time_ms = recorder.time * 1000
+        if limit is not None and time_ms > limit:
+            problems.append(f'время БД {time_ms:.1f} мс > {limit} мс')
+        if not problems:
+            return
+        message = '{} {}: {}'.format(
+            request.method, request.path, ', '.join(problems)
+        )
+        duplicates = recorder.duplicates()
+        if duplicates:
+            message += '\nповторяющиеся запросы:\n' + '\n'.join(
+                f'  {n} x {sql}' for sql, n in duplicates
+            )
+        logger.warning(message)
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(message)
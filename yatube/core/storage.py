@@ -0,0 +1,55 @@
+import hashlib
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# два уровня подкаталогов по два hex-символа: 65536 каталогов, в каждом
+# мало файлов даже при миллионах загрузок
+SHARD_RE = r'[0-9a-f]{2}/[0-9a-f]{2}/[^/]+$'
+
+
+def content_hash(content):
+    digest = hashlib.sha1()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sharded_dir(name):
+    '''Каталог из MEDIA_SHARDED_DIRS, в котором лежит name, или None.'''
+    for directory in settings.MEDIA_SHARDED_DIRS:
+        if name.startswith(directory):
+            return directory
+    return None
+
+
+def is_sharded(name):
+    directory = sharded_dir(name)
+    return directory is not None and re.match(
+        SHARD_RE, name[len(directory):]
+    ) is not None
+
+
+def sharded_name(name, digest):
+    '''posts/photo.jpg -> posts/ab/cd/photo.jpg по хешу содержимого.'''
+    directory = sharded_dir(name)
+    return posixpath.join(
+        directory, digest[:2], digest[2:4], posixpath.basename(name)
+    )
+
+
+@deconstructible
+class ShardedStorage(FileSystemStorage):
+    '''
+    Файловое хранилище, которое раскладывает файлы из каталогов
+    settings.MEDIA_SHARDED_DIRS по подкаталогам из хеша содержимого.
+    upload_to полей не меняется: путь уточняется при сохранении.
+    '''
+
+    def save(self, name, content, max_length=None):
+        if name and sharded_dir(name) and not is_sharded(name):
+            name = sharded_name(name, content_hash(content))
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,81 @@
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
+from copy import deepcopy
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+SQLITE_CACHE = 'core.cache.sqlite.SQLiteCache'
+CACHE_DIR_VARIABLE = 'YATUBE_CACHE_DIR'
+MEDIA_ROOT_VARIABLE = 'YATUBE_MEDIA_ROOT'
+
+
+@contextmanager
+def environ(name, value):
+    '''Переменная окружения name на время блока.'''
+    previous = os.environ.get(name)
+    os.environ[name] = value
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ[name]
+        else:
+            os.environ[name] = previous
+
+
+@contextmanager
+def isolated_caches():
+    '''
+    Переносит файлы кешей SQLiteCache во временный каталог: cache.clear()
+    в тестах не трогает кеш запущенного сервера, а одновременные прогоны
+    тестов - друг друга. Каталог передаётся и через окружение, чтобы его
+    видели процессы, запущенные тестами (пул миниатюр).
+    '''
+    with tempfile.TemporaryDirectory(prefix='yatube-cache-') as directory:
+        caches = deepcopy(settings.CACHES)
+        for params in caches.values():
+            if params['BACKEND'] == SQLITE_CACHE:
+                params['LOCATION'] = os.path.join(
+                    directory, os.path.basename(params['LOCATION'])
+                )
+        with environ(CACHE_DIR_VARIABLE, directory), override_settings(
+            CACHE_DIR=directory, CACHES=caches
+        ):
+            yield
+
+
+@contextmanager
+def isolated_media():
+    '''
+    Загрузки тестов, в том числе файлы, которые mixer создаёт для
+    ImageField, и миниатюры к ним пишутся во временный MEDIA_ROOT, а не
+    в yatube/media. Как и у кешей, каталог передаётся процессам пула
+    миниатюр через окружение. Сами миниатюры создаются без пула
+    (THUMBNAIL_ASYNC = False): его процессы не видят тестовую БД, и
+    хранилище sorl в них открывало бы db.sqlite3 проекта.
+    '''
+    with tempfile.TemporaryDirectory(prefix='yatube-media-') as directory:
+        with environ(MEDIA_ROOT_VARIABLE, directory), override_settings(
+            MEDIA_ROOT=directory, THUMBNAIL_ASYNC=False
+        ):
+            yield
+
+
+class TestRunner(DiscoverRunner):
+    '''
+    Запуск manage.py test с кешами из isolated_caches() и загрузками
+    из isolated_media().
+    '''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._isolation = ExitStack()
+        self._isolation.enter_context(isolated_caches())
+        self._isolation.enter_context(isolated_media())
+
+    def teardown_test_environment(self, **kwargs):
+        self._isolation.close()
+        super().teardown_test_environment(**kwargs)
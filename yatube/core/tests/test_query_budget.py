@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.middleware.query_budget import QueryBudgetExceeded, fingerprint
+from posts.models import Post
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_fingerprint_groups_parameters(self):
+        '''Отпечаток запроса не зависит от значений параметров.'''
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s) LIMIT 10'),
+        )
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': {'queries': 0}},
+        QUERY_BUDGET_RAISE=True,
+    )
+    def test_budget_violation_is_fatal(self):
+        '''Превышение бюджета из настроек выбрасывает исключение.'''
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.guest_client.get(reverse('posts:index'))
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_views_fit_declared_budgets(self):
+        '''Ленты укладываются в бюджеты, заданные декоратором.'''
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                self.guest_client.get(url)
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from core.cache.sqlite import SQLiteCache
+
+
+def _increment(location):
+    cache = SQLiteCache(location, {})
+    for _ in range(50):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.location = os.path.join(self.tmp, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {'TIMEOUT': 60})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_basic_operations(self):
+        '''get/set/add/get_many/set_many/delete работают как у Django.'''
+        cache = self.cache
+        cache.set('a', {'x': 1})
+        self.assertEqual(cache.get('a'), {'x': 1})
+        self.assertFalse(cache.add('a', 2))
+        self.assertTrue(cache.add('b', 2))
+        cache.set_many({'c': 3, 'd': [4]})
+        self.assertEqual(
+            cache.get_many(['a', 'b', 'c', 'd', 'e']),
+            {'a': {'x': 1}, 'b': 2, 'c': 3, 'd': [4]},
+        )
+        cache.delete_many(['a', 'b'])
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.incr('c', 10), 13)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_timeouts(self):
+        '''Просроченные ключи не читаются и могут быть добавлены заново.'''
+        cache = self.cache
+        cache.set('short', 1, 0.05)
+        cache.set('forever', 1, None)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertFalse(cache.has_key('short'))
+        self.assertTrue(cache.add('short', 2))
+        self.assertEqual(cache.get('short'), 2)
+        self.assertTrue(cache.has_key('forever'))
+
+    def test_large_values_compressed(self):
+        '''Большие значения хранятся сжатыми и читаются без изменений.'''
+        page = ''.join(f'<article>пост {n}</article>' for n in range(500))
+        self.cache.set('page', page)
+        self.cache.set('small', 'x')
+        self.assertEqual(self.cache.get('page'), page)
+        stats = self.cache.stats()
+        self.assertEqual((stats['entries'], stats['compressed']), (2, 1))
+        self.assertLess(stats['bytes'], len(page.encode()))
+
+    def test_shared_between_processes(self):
+        '''Процессы видят записи друг друга, incr не теряет обновлений.'''
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.location,))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_tests_use_own_file(self):
+        '''Тесты не пишут в файл кеша запущенного сервера.'''
+        self.assertFalse(
+            caches['shared']._path.startswith(settings.BASE_DIR)
+        )
@@ -0,0 +1,65 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core.cache.stampede import LOCK_KEY, get_or_compute
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stampede-test',
+    },
+}
+
+
+@override_settings(CACHES=CACHES, CACHE_EARLY_REFRESH_BETA=0)
+class StampedeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='new', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_concurrent_misses_compute_once(self):
+        '''Одновременные промахи пересчитывают значение один раз.'''
+        results = []
+
+        def worker():
+            results.append(get_or_compute(
+                'key', self.compute(delay=0.2), 60, lock_timeout=5
+            ))
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['new'] * 8)
+
+    def test_stale_value_served_while_other_recomputes(self):
+        '''Пока пересчитывает другой процесс, отдаётся прежнее значение.'''
+        get_or_compute('key', self.compute('old'), 60, version=1)
+        cache.add(LOCK_KEY.format('key'), 'other', 5)
+        value = get_or_compute('key', self.compute(), 60, version=2)
+        self.assertEqual((value, self.calls), ('old', 1))
+        cache.delete(LOCK_KEY.format('key'))
+        value = get_or_compute('key', self.compute(), 60, version=2)
+        self.assertEqual((value, self.calls), ('new', 2))
+
+    def test_expired_value_kept_for_grace_window(self):
+        '''После timeout значение живёт ещё grace секунд как устаревшее.'''
+        get_or_compute('key', self.compute('old'), 0.05, grace=60)
+        time.sleep(0.1)
+        cache.add(LOCK_KEY.format('key'), 'other', 5)
+        self.assertEqual(get_or_compute('key', self.compute(), 0.05), 'old')
+
+    def test_uncacheable_value_not_stored(self):
+        get_or_compute('key', self.compute(), 60, cacheable=lambda v: False)
+        self.assertIsNone(cache.get('key'))
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import codec
+from core.cache import tiered
+from core.cache.tiered import TieredCache
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'l2': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-test',
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        # два экземпляра с отдельными L1 изображают два процесса
+        self.first, self.second = (
+            TieredCache('l2', {'OPTIONS': {
+                'L1_MAX_AGE': 0.05,
+                'L1_MAX_BYTES': 4096,
+                'COMPRESS_MIN_SIZE': 512,
+            }})
+            for _ in range(2)
+        )
+        for tier in (self.first, self.second):
+            tier._l1 = OrderedDict()
+            tier._lock = threading.Lock()
+            tier._stats = Counter()
+        self.first.clear()
+        tiered._published.clear()
+
+    def test_hits_are_counted_per_tier(self):
+        '''Первое чтение идёт в L2, повторное отдаётся из L1.'''
+        self.first.set('key', {'value': 1})
+        self.second.get('key')
+        self.second.get('key')
+        self.second.get('missing')
+        stats = self.second.stats()
+        self.assertEqual(stats['l1_hits'], 1)
+        self.assertEqual(stats['l2_hits'], 1)
+        self.assertEqual(stats['l2_misses'], 1)
+
+    def test_invalidation_reaches_other_l1_within_bound(self):
+        '''Изменение в другом процессе видно не позже L1_MAX_AGE.'''
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'old')
+        time.sleep(0.06)
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        time.sleep(0.06)
+        self.assertIsNone(self.second.get('key'))
+
+    def test_l1_returns_copies(self):
+        '''Изменение полученного объекта не портит запись в L1.'''
+        self.first.set('key', {'value': 1})
+        self.first.get('key')['value'] = 2
+        self.assertEqual(self.first.get('key'), {'value': 1})
+
+    def test_l1_bounded_by_bytes_and_compressed(self):
+        '''Большие значения сжимаются, L1 не выходит за L1_MAX_BYTES.'''
+        page = [f'<article>пост {n}</article>' for n in range(200)]
+        for i in range(10):
+            self.first.set(f'page:{i}', page + [i])
+        stats = self.first.stats()
+        self.assertLessEqual(stats['l1_bytes'], 4096)
+        self.assertGreater(stats['l1_evictions'], 0)
+        self.assertEqual(stats['l1_compressed'], stats['l1_entries'])
+        self.assertEqual(self.first.get('page:0'), page + [0])
+        self.assertTrue(codec.is_compressed(codec.dumps(page, 512)))
+
+    def test_stats_command_reads_published_stats(self):
+        '''Процессы публикуют статистику, cache_stats её сводит.'''
+        self.first.get('key')
+        self.assertEqual(len(self.first.process_stats()), 1)
+        with self.settings(CACHES=dict(CACHES, tiered={
+            'BACKEND': 'core.cache.tiered.TieredCache',
+            'LOCATION': 'l2',
+        })):
+            out = StringIO()
+            call_command('cache_stats', stdout=out)
+        self.assertIn('tiered всего (1 проц.)', out.getvalue())
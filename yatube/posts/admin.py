@@ -1,22 +1,220 @@
+from datetime import date, datetime, time, timedelta
+
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from . import search
 from .models import Post, Group, Comment
+from .services import EstimatedCountPaginator
+
+
+def _period_start(value, kind):
+    if kind == 'year':
+        return date(value.year, 1, 1)
+    if kind == 'month':
+        return date(value.year, value.month, 1)
+    return date(value.year, value.month, value.day)
+
+
+def _next_period(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _edge_field(aggregate):
+    '''Имя поля, если aggregate - Min или Max по полю без условий.'''
+    if type(aggregate) not in (models.Min, models.Max) or aggregate.filter:
+        return None
+    source, = aggregate.get_source_expressions()
+    return source.name if isinstance(source, models.F) else None
+
+
+class ChangeListQuerySet(models.QuerySet):
+    '''
+    QuerySet списка объектов, на котором навигация по датам
+    (date_hierarchy) идёт по индексу поля даты, а не полным проходом.
+    '''
+
+    def dates(self, field_name, kind, order='ASC'):
+        '''
+        Как QuerySet.dates(), но каждая следующая дата находится поиском
+        по индексу с начала следующего периода: запрос на каждую дату
+        вместо DISTINCT по всей выборке.
+        '''
+        is_datetime = isinstance(
+            self.model._meta.get_field(field_name), models.DateTimeField
+        )
+        values = self.order_by(field_name).values_list(field_name, flat=True)
+        result = []
+        value = values.first()
+        while value is not None:
+            if is_datetime and settings.USE_TZ:
+                value = timezone.localtime(value)
+            start = _period_start(value, kind)
+            result.append(start)
+            boundary = _next_period(start, kind)
+            if is_datetime:
+                boundary = datetime.combine(boundary, time.min)
+                if settings.USE_TZ:
+                    boundary = timezone.make_aware(boundary)
+            value = values.filter(**{f'{field_name}__gte': boundary}).first()
+        return result if order == 'ASC' else result[::-1]
+
+    def aggregate(self, *args, **kwargs):
+        '''
+        Min и Max по полю берутся с края индекса (ORDER BY ... LIMIT 1):
+        SQLite делает это сам только для запроса с одним агрегатом без
+        аннотаций, иначе читает всю выборку.
+        '''
+        aggregates = dict(kwargs)
+        for arg in args:
+            aggregates[arg.default_alias] = arg
+        fields = {
+            alias: _edge_field(aggregate)
+            for alias, aggregate in aggregates.items()
+        }
+        if not aggregates or None in fields.values():
+            return super().aggregate(*args, **kwargs)
+        result = {}
+        for alias, field in fields.items():
+            values = self.filter(**{f'{field}__isnull': False}).order_by(
+                field
+            ).values_list(field, flat=True)
+            if isinstance(aggregates[alias], models.Min):
+                result[alias] = values.first()
+            else:
+                result[alias] = values.last()
+        return result
+
+
+class RowAutocompleteSelect(AutocompleteSelect):
+    '''
+    AutocompleteSelect, который показывает выбранный объект selected,
+    уже загруженный вместе со строкой списка (list_select_related),
+    без отдельного запроса на каждую строку.
+    '''
+    selected = None
 
+    def optgroups(self, name, value, attr=None):
+        selected = self.selected
+        values = [str(v) for v in value if v not in ('', None)]
+        if selected is None or values != [str(selected.pk)]:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        options.append(self.create_option(
+            name, selected.pk,
+            self.choices.field.label_from_instance(selected),
+            True, len(options),
+        ))
+        return [(None, options, 0)]
 
-class PostAdmin(admin.ModelAdmin):
+
+class ChangeListRowForm(forms.ModelForm):
+    '''Форма строки list_editable: передаёт виджетам загруженные объекты.'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            # связанные поля обёрнуты в RelatedFieldWidgetWrapper
+            widget = getattr(field.widget, 'widget', field.widget)
+            if not isinstance(widget, RowAutocompleteSelect):
+                continue
+            related = self.instance._meta.get_field(name)
+            if related.is_cached(self.instance):
+                widget.selected = related.get_cached_value(self.instance)
+
+
+class ChangeListMixin:
+    '''
+    Списки объектов для больших таблиц: примерный счёт записей,
+    навигация по датам по индексу, поля list_editable без запроса на
+    каждую строку, поиск по индексу FTS5
+    (posts.search) вместо LIKE '%...%' по search_fields. Без индекса
+    (не SQLite) работает обычный поиск Django.
+    '''
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return ChangeListQuerySet(
+            self.model, query=queryset.query, using=queryset.db
+        )
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', ChangeListRowForm)
+        return super().get_changelist_form(request, **kwargs)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', RowAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'),
+            ))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and search.is_available():
+            return search.filter_matching(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+class PostAdmin(ChangeListMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
     list_editable = ('group',)
+    # в строках и форме - поле с подгрузкой вариантов, а не <select>
+    # со всеми группами и пользователями
+    autocomplete_fields = ('group',)
+    raw_id_fields = ('author',)
 
 
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'post', 'author', 'text', 'pub_date')
+class CommentAdmin(ChangeListMixin, admin.ModelAdmin):
+    list_display = ('pk', 'post_preview', 'author', 'text', 'pub_date')
+    list_select_related = ('author',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
+    raw_id_fields = ('post', 'author')
+
+    def get_queryset(self, request):
+        # начало текста поста вместо загрузки постов целиком ради
+        # __str__; подзапрос, а не JOIN, чтобы счёт записей и даты его
+        # не выполняли
+        return super().get_queryset(request).annotate(
+            post_text=Subquery(Post.objects.filter(
+                pk=OuterRef('post_id')
+            ).values(short=Substr('text', 1, 15))[:1])
+        )
+
+    def post_preview(self, obj):
+        return obj.post_text
+    post_preview.short_description = 'Пост'
+    post_preview.admin_order_field = 'post'
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,220 @@
+import hashlib
+import time
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from core.cache.stampede import get_or_compute
+
+from . import thumbnails
+from .services import cached_groups
+from .models import Post, User
+
+VERSION_KEY = 'feed-version:{}'
+ALL_FEEDS = 'all'
+
+
+# Кеш страниц лент живёт FEED_CACHE_TIMEOUT, а актуальность держится
+# номерами версий: версия хранится вместе со страницей и увеличивается
+# сигналами при изменении данных, после чего страница с прежней версией
+# считается устаревшей и пересобирается. Новая версия начинается
+# с текущего времени в мс, чтобы вытесненный из кеша счётчик не совпал
+# с уже использованным.
+
+def _new_version():
+    return int(time.time() * 1000)
+
+
+def feed_versions(*names):
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_feeds(*names):
+    for name in set(names):
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def profile_feed(username):
+    return f'profile:{username}'
+
+
+def invalidate_post(post, old_group_id=None, old_author_id=None):
+    '''Сбрасывает ленты, в которых показывается карточка поста.'''
+    names = ['index', profile_feed(post.author.username)]
+    if old_author_id not in (None, post.author_id):
+        names.extend(
+            profile_feed(username) for username in User.objects.filter(
+                pk=old_author_id
+            ).values_list('username', flat=True)
+        )
+    group_ids = {post.group_id, old_group_id} - {None}
+    names.extend(
+        group_feed(group.slug) for group in cached_groups()
+        if group.pk in group_ids
+    )
+    bump_feeds(*names)
+
+
+def _feed_name(feed, kwarg, kwargs):
+    return feed if kwarg is None else f'{feed}:{kwargs[kwarg]}'
+
+
+def page_key(request, feed):
+    # как vary_on_cookie: у каждого набора cookie своя копия страницы
+    url = request.build_absolute_uri()
+    cookie = request.META.get('HTTP_COOKIE', '')
+    digest = hashlib.md5(f'{url}\n{cookie}'.encode()).hexdigest()
+    return f'feed-page:{feed}:{digest}'
+
+
+def _cacheable(request, response):
+    # те же условия, что у UpdateCacheMiddleware
+    if response.streaming or response.status_code != 200:
+        return False
+    if 'private' in response.get('Cache-Control', ()):
+        return False
+    return not (response.cookies and not request.COOKIES)
+
+
+def cache_feed(feed, kwarg=None, timeout=None):
+    '''
+    Кеширует страницу ленты. feed - имя ленты, kwarg - аргумент view,
+    уточняющий её (slug группы, имя автора). Копия страницы хранится
+    под постоянным ключом вместе с версией ленты: после изменения
+    данных страницу пересобирает один запрос, остальные в это время
+    получают прежнюю копию (core.cache.stampede).
+    '''
+    def decorator(view_func):
+        varying_view = vary_on_cookie(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return varying_view(request, *args, **kwargs)
+            versions = feed_versions(
+                ALL_FEEDS, _feed_name(feed, kwarg, kwargs)
+            )
+
+            def compute():
+                response = varying_view(request, *args, **kwargs)
+                # ETag версий, с которыми собрана страница, хранится
+                # вместе с ней: прежняя копия, отданная во время
+                # пересборки, не получит ETag новой версии от condition()
+                if response.status_code == 200:
+                    response['ETag'] = quote_etag(_etag(request, *versions))
+                return response
+
+            return get_or_compute(
+                page_key(request, feed),
+                compute,
+                timeout or settings.FEED_CACHE_TIMEOUT,
+                version='{}.{}'.format(*versions),
+                cacheable=partial(_cacheable, request),
+            )
+        return wrapper
+    return decorator
+
+
+def _etag(request, *parts):
+    # страница зависит от пользователя: без cookie сессии - общая
+    # анонимная, с ней - своя для каждой сессии, как и в кеше страниц
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+    key = ':'.join(map(str, parts + (session,)))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def conditional(etag_func):
+    '''
+    condition() с валидатором etag_func и Cache-Control: no-cache, чтобы
+    браузер каждый раз сверял ETag, а не показывал устаревшую копию.
+    '''
+    def decorator(view_func):
+        @condition(etag_func=etag_func)
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def feed_etag(feed, kwarg=None):
+    '''ETag ленты из её версий: считается без запросов к БД.'''
+    def etag(request, *args, **kwargs):
+        return _etag(request, *feed_versions(
+            ALL_FEEDS, _feed_name(feed, kwarg, kwargs)
+        ))
+    return etag
+
+
+def post_etag(request, post_id):
+    '''
+    ETag страницы поста: время изменения поста (меняется и при
+    комментариях), версия ленты автора, от которой зависит число его
+    постов, и ALL_FEEDS, которую меняют группы и имена пользователей.
+    Один короткий запрос вместо сборки страницы.
+    '''
+    stamp = Post.objects.filter(pk=post_id).values_list(
+        'updated_at', 'author__username'
+    ).first()
+    if stamp is None:
+        return None
+    updated_at, username = stamp
+    return _etag(
+        request, post_id, updated_at.timestamp(),
+        *feed_versions(ALL_FEEDS, profile_feed(username)),
+    )
+
+
+def card_key(post, template_name, version):
+    stamp = int(post.updated_at.timestamp() * 1000000)
+    return f'post-card:{template_name}:{version}:{post.pk}:{stamp}'
+
+
+def attach_cards(posts, template_name='posts/includes/post.html'):
+    '''
+    Кладёт в post.card готовую карточку поста. Карточки страницы читаются
+    из кеша одним get_many, рендерятся только промахи, а их миниатюры
+    выбираются одним пакетом. Ключ меняется вместе с post.updated_at,
+    а также при любом изменении групп.
+    '''
+    posts = list(posts)
+    version, = feed_versions(ALL_FEEDS)
+    keys = [card_key(post, template_name, version) for post in posts]
+    cards = cache.get_many(keys)
+    to_render = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    thumbnails.prefetch(post for key, post in to_render)
+    missing = {
+        key: render_to_string(template_name, {'post': post})
+        for key, post in to_render
+    }
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_TIMEOUT)
+        cards.update(missing)
+    for key, post in zip(keys, posts):
+        post.card = mark_safe(cards[key])
+    return posts
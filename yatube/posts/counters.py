@@ -0,0 +1,92 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+# Счётчики хранятся в UserStats и Post.comments_count и меняются
+# сигналами на F()-выражениях. Строка UserStats создаётся лениво
+# пересчётом, так что записи, созданные в обход сигналов (bulk_create),
+# учитываются при первом обращении; расхождения чинит команда recount.
+
+def _count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total')
+        ),
+        0,
+    )
+
+
+def recount_users(user_ids):
+    '''Пересчитывает UserStats для пачки пользователей.'''
+    users = User.objects.filter(pk__in=user_ids).annotate(
+        posts_total=_count_of(Post, 'author'),
+        followers_total=_count_of(Follow, 'author'),
+        following_total=_count_of(Follow, 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+    stats = []
+    with transaction.atomic():
+        for pk, posts, followers, following in users:
+            obj, _ = UserStats.objects.update_or_create(
+                user_id=pk,
+                defaults={
+                    'posts_count': posts,
+                    'followers_count': followers,
+                    'following_count': following,
+                },
+            )
+            stats.append(obj)
+    return stats
+
+
+def recount_posts(post_ids):
+    return Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count_of(Comment, 'post')
+    )
+
+
+def user_stats(user_id):
+    try:
+        return UserStats.objects.get(user_id=user_id)
+    except UserStats.DoesNotExist:
+        stats = recount_users([user_id])
+        return stats[0] if stats else UserStats(user_id=user_id)
+
+
+def _guarded(deltas):
+    # не даём счётчику уйти ниже нуля, если он уже разошёлся с данными
+    return {
+        f'{field}__gte': -delta for field, delta in deltas.items()
+        if delta < 0
+    }
+
+
+def bump_user(user_id, **deltas):
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if UserStats.objects.filter(
+        user_id=user_id, **_guarded(deltas)
+    ).update(**updates):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        # при каскадном удалении пользователя его строку пересоздавать
+        # нельзя; отсутствующая строка пересчитается при чтении
+        return
+    # строки ещё нет: пересчёт уже учитывает текущее изменение
+    try:
+        recount_users([user_id])
+    except IntegrityError:
+        UserStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(
+        pk=post_id, **_guarded({'comments_count': delta})
+    ).update(
+        comments_count=F('comments_count') + delta,
+        updated_at=timezone.now(),
+    )
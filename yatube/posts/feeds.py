@@ -0,0 +1,233 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from . import counters
+from .models import Follow, Post, TimelineEntry, User, UserStats
+from .services import CursorPaginator, post_feed
+
+HEAVY_AUTHORS_KEY = 'feeds:heavy_authors'
+
+
+# Авторы, набравшие FEED_PUSH_FOLLOWER_LIMIT подписчиков, переводятся
+# на чтение при чтении (UserStats.feed_pulled): их посты не
+# раскладываются по лентам при публикации, а подмешиваются к ленте
+# читателя при чтении. Обратно к раскладке автор возвращается, только
+# когда подписчиков стало меньше FEED_PUSH_RESUME_LIMIT, и не в запросе:
+# команда rebuild_timelines докладывает его посты в ленты подписчиков.
+# Остальные авторы идут через TimelineEntry.
+
+def pulled_authors(stats):
+    '''
+    Авторы из stats, чьи посты читаются при чтении; набравшие
+    FEED_PUSH_FOLLOWER_LIMIT подписчиков переводятся на чтение сразу.
+    '''
+    promoted = [
+        item.user_id for item in stats
+        if not item.feed_pulled
+        and item.followers_count >= settings.FEED_PUSH_FOLLOWER_LIMIT
+    ]
+    if promoted:
+        UserStats.objects.filter(user_id__in=promoted).update(
+            feed_pulled=True
+        )
+        cache.delete(HEAVY_AUTHORS_KEY)
+    return {item.user_id for item in stats if item.feed_pulled}.union(
+        promoted
+    )
+
+
+def is_pulled(author_id):
+    return author_id in pulled_authors([counters.user_stats(author_id)])
+
+
+def heavy_author_ids():
+    '''Множество авторов, чьи посты читаются при чтении ленты.'''
+    return cache.get_or_set(
+        HEAVY_AUTHORS_KEY,
+        lambda: frozenset(
+            UserStats.objects.filter(feed_pulled=True).values_list(
+                'user_id', flat=True
+            )
+        ),
+        settings.FEED_HEAVY_AUTHORS_TTL,
+    )
+
+
+def resumable_author_ids():
+    '''Читаемые при чтении авторы, которых пора вернуть к раскладке.'''
+    return UserStats.objects.filter(
+        feed_pulled=True,
+        followers_count__lt=settings.FEED_PUSH_RESUME_LIMIT,
+    ).values_list('user_id', flat=True)
+
+
+def resume_push(author_id):
+    '''
+    Возвращает автора к раскладке и докладывает его посты, вышедшие без
+    раскладки, в ленты подписчиков. Флаг снимается до доклада: посты,
+    опубликованные во время него, уже раскладываются сами.
+    '''
+    UserStats.objects.filter(user_id=author_id).update(feed_pulled=False)
+    cache.delete(HEAVY_AUTHORS_KEY)
+    follower_ids = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for follower_id in follower_ids.iterator():
+        add_author(follower_id, author_id)
+
+
+def fan_out_post(post):
+    '''Раскладывает новый пост по лентам подписчиков автора.'''
+    fan_out_posts([post])
+
+
+def _due_for_trim(user_id, post_id):
+    # ленту обрезают примерно раз в TIMELINE_TRIM_EVERY вставок, сдвиг
+    # на user_id разносит обрезки подписчиков автора по разным постам
+    return (user_id + post_id) % settings.TIMELINE_TRIM_EVERY == 0
+
+
+def fan_out_posts(posts):
+    '''Раскладывает пачку постов одним запросом к подпискам.'''
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append(post)
+    followers = Follow.objects.filter(
+        author_id__in=by_author
+    ).values_list('author_id', 'user_id')
+    due = set()
+
+    def entries():
+        for author_id, user_id in followers.iterator():
+            for post in by_author[author_id]:
+                if _due_for_trim(user_id, post.pk):
+                    due.add(user_id)
+                yield TimelineEntry(
+                    user_id=user_id, post=post, pub_date=post.pub_date
+                )
+
+    TimelineEntry.objects.bulk_create(
+        entries(),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    for user_id in due:
+        trim_timeline(user_id)
+
+
+def add_author(user_id, author_id):
+    '''Докладывает в ленту читателя свежие посты нового автора.'''
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim_timeline(user_id)
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def post_published(post):
+    if not is_pulled(post.author_id):
+        fan_out_post(post)
+
+
+def post_reassigned(post):
+    '''Переносит пост у сменившего автора из прежних лент в новые.'''
+    TimelineEntry.objects.filter(post=post).delete()
+    post_published(post)
+
+
+def author_followed(user_id, author_id):
+    if not is_pulled(author_id):
+        add_author(user_id, author_id)
+
+
+def author_unfollowed(user_id, author_id):
+    remove_author(user_id, author_id)
+
+
+def trim_timeline(user_id, length=None):
+    '''Удаляет из ленты всё, что старше length последних записей.'''
+    length = length or settings.TIMELINE_LENGTH
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    boundary = entries.order_by('-pub_date', '-pk').values_list(
+        'pub_date', 'pk'
+    )[length:length + 1]
+    if not boundary:
+        return 0
+    pub_date, pk = boundary[0]
+    deleted, _ = entries.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lte=pk)
+    ).delete()
+    return deleted
+
+
+def rebuild_timeline(user_id):
+    heavy = heavy_author_ids()
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        for author_id in Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True):
+            if author_id not in heavy:
+                add_author(user_id, author_id)
+
+
+def timeline_user_ids():
+    return User.objects.filter(
+        follower__isnull=False
+    ).values_list('pk', flat=True).distinct().order_by('pk')
+
+
+class FollowFeedPaginator(CursorPaginator):
+    '''
+    Лента подписок: записи TimelineEntry читателя, слитые с постами
+    популярных авторов, на которых он подписан. Обе части выбираются
+    по ключу (pub_date, id поста), поэтому курсор у них общий.
+    '''
+
+    def __init__(self, object_list, per_page, user):
+        super().__init__(object_list, per_page)
+        self.user = user
+
+    def pulled_author_ids(self):
+        heavy = heavy_author_ids()
+        if not heavy:
+            return []
+        return list(Follow.objects.filter(
+            user=self.user, author_id__in=heavy
+        ).values_list('author_id', flat=True))
+
+    def fetch(self, cursor, backwards, limit):
+        entries = self.slice(
+            TimelineEntry.objects.filter(user=self.user).select_related(
+                'post__author', 'post__group'
+            ),
+            cursor, backwards, limit, key=('pub_date', 'post_id'),
+        )
+        posts = {entry.post.pk: entry.post for entry in entries}
+        pulled = self.pulled_author_ids()
+        if pulled:
+            for post in self.slice(
+                post_feed(Post.objects.filter(author_id__in=pulled)),
+                cursor, backwards, limit,
+            ):
+                posts.setdefault(post.pk, post)
+        return sorted(
+            posts.values(),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not backwards,
+        )[:limit]
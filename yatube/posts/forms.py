@@ -1,5 +1,7 @@
 from django import forms
+from .images import fill_image_preview
 from .models import Post, Comment
+from .services import CachedGroupQuerySet, cached_groups
 
 
 class PostForm(forms.ModelForm):
@@ -14,6 +16,32 @@ class PostForm(forms.ModelForm):
             'image': forms.ClearableFileInput(attrs={'class': 'form-control'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # группы из кеша: ни показ формы, ни проверка выбора не
+        # запрашивают Group
+        group = self.fields['group']
+        group.queryset = CachedGroupQuerySet()
+        group.choices = [('', group.empty_label)] + [
+            (item.pk, group.label_from_instance(item))
+            for item in cached_groups()
+        ]
+
+    def _get_validation_exclusions(self):
+        # выбор группы уже проверен полем по кешу, без этого
+        # ForeignKey.validate() повторит проверку запросом
+        return super()._get_validation_exclusions() + ['group']
+
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        if 'image' in self.changed_data:
+            # превью считается один раз, по загруженному файлу
+            fill_image_preview(post, self.cleaned_data['image'] or None)
+        if commit:
+            post.save()
+            self.save_m2m()
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,29 @@
+from base64 import b64encode
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# превью в пропорциях кадра миниатюры 960x339, растягивается браузером
+PREVIEW_SIZE = (24, 8)
+PREVIEW_QUALITY = 50
+
+
+def make_preview(file):
+    '''
+    Крошечное превью изображения (LQIP) в виде data URI. Файл читается
+    один раз и возвращается в начало.
+    '''
+    file.seek(0)
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        preview = ImageOps.fit(image.convert('RGB'), PREVIEW_SIZE)
+    file.seek(0)
+    buffer = BytesIO()
+    preview.save(buffer, 'JPEG', quality=PREVIEW_QUALITY)
+    return 'data:image/jpeg;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+def fill_image_preview(post, file=None):
+    '''Заполняет превью картинки поста или очищает его.'''
+    file = file if file is not None else post.image
+    post.image_placeholder = make_preview(file) if file else ''
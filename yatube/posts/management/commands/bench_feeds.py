@@ -0,0 +1,113 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from posts import feeds
+from posts.models import Follow, Post, TimelineEntry, User
+
+STRATEGIES = (
+    ('push', 10 ** 9),
+    ('pull', 0),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает раскладку ленты при записи, сборку при чтении и '
+        'гибрид на синтетическом графе подписок со степенным '
+        'распределением популярности. Все данные откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--posts', type=int, default=3000)
+        parser.add_argument('--readers', type=int, default=200)
+        parser.add_argument('--max-follows', type=int, default=300)
+        parser.add_argument('--alpha', type=float, default=1.1)
+        parser.add_argument('--threshold', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def build_graph(self, options):
+        rng = random.Random(options['seed'])
+        users = options['users']
+        # популярность автора убывает по степенному закону от ранга
+        weights = [
+            1 / (rank + 1) ** options['alpha'] for rank in range(users)
+        ]
+        edges = set()
+        for user in range(users):
+            follows = min(
+                options['max_follows'], int(rng.paretovariate(1.2))
+            )
+            for author in rng.choices(range(users), weights, k=follows):
+                if author != user:
+                    edges.add((user, author))
+        authors = [rng.randrange(users) for _ in range(options['posts'])]
+        readers = rng.sample(range(users), options['readers'])
+        return sorted(edges), authors, readers
+
+    def run_strategy(self, threshold, graph, options):
+        edges, authors, readers = graph
+        with override_settings(
+            FEED_PUSH_FOLLOWER_LIMIT=threshold,
+            FEED_PUSH_RESUME_LIMIT=threshold,
+        ):
+            with transaction.atomic():
+                cache.delete(feeds.HEAVY_AUTHORS_KEY)
+                User.objects.bulk_create(
+                    (
+                        User(username=f'feed-bench-{i:07}')
+                        for i in range(options['users'])
+                    ),
+                    batch_size=500,
+                )
+                # sqlite не возвращает pk из bulk_create
+                users = list(User.objects.filter(
+                    username__startswith='feed-bench-'
+                ).order_by('username'))
+                Follow.objects.bulk_create(
+                    (
+                        Follow(user=users[user], author=users[author])
+                        for user, author in edges
+                    ),
+                    batch_size=500,
+                )
+                started = time.perf_counter()
+                for author in authors:
+                    Post.objects.create(text='bench', author=users[author])
+                write_time = time.perf_counter() - started
+                rows = TimelineEntry.objects.count()
+                started = time.perf_counter()
+                for reader in readers:
+                    paginator = feeds.FollowFeedPaginator(
+                        Post.objects.none(), 10, user=users[reader]
+                    )
+                    page = paginator.get_cursor_page()
+                    if page.next_cursor:
+                        paginator.get_cursor_page(after=page.next_cursor)
+                read_time = time.perf_counter() - started
+                transaction.set_rollback(True)
+            cache.delete(feeds.HEAVY_AUTHORS_KEY)
+        return write_time, read_time, rows
+
+    def handle(self, *args, **options):
+        graph = self.build_graph(options)
+        self.stdout.write(
+            f'подписок: {len(graph[0])}, постов: {len(graph[1])}, '
+            f'читателей: {len(graph[2])}'
+        )
+        strategies = STRATEGIES + (('hybrid', options['threshold']),)
+        for name, threshold in strategies:
+            write_time, read_time, rows = self.run_strategy(
+                threshold, graph, options
+            )
+            self.stdout.write(
+                f'{name:>7}: запись {write_time * 1000 / len(graph[1]):.2f} '
+                f'мс/пост, чтение '
+                f'{read_time * 1000 / len(graph[2]):.2f} мс/2 страницы, '
+                f'строк ленты {rows}'
+            )
@@ -0,0 +1,71 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import caching, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие варианты миниатюр для всех загруженных '
+        'изображений в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=8)
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='постов в одном обновлении updated_at',
+        )
+
+    def names(self, size):
+        # имена читаются кусками по ключу: в пул одновременно уходит
+        # не больше size изображений, а не весь список
+        names = Post.objects.exclude(image='').order_by(
+            'image'
+        ).values_list('image', flat=True).distinct()
+        last = ''
+        while True:
+            chunk = list(names.filter(image__gt=last)[:size])
+            if not chunk:
+                return
+            yield chunk
+            last = chunk[-1]
+
+    def touch_posts(self, size):
+        # кусками pk, как в recount: каждое обновление - своя короткая
+        # транзакция, и sqlite не держит блокировку записи на всю таблицу
+        posts = Post.objects.exclude(image='')
+        last_pk = 0
+        while True:
+            pks = list(posts.filter(pk__gt=last_pk).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:size])
+            if not pks:
+                return
+            Post.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+            last_pk = pks[-1]
+
+    def handle(self, *args, **options):
+        processes = options['processes'] or os.cpu_count()
+        chunk_size = options['chunk_size']
+        done = failed = 0
+        with thumbnails.process_pool(processes) as pool:
+            for names in self.names(chunk_size * processes):
+                results = pool.map(
+                    thumbnails.try_render_variants, names,
+                    chunksize=chunk_size,
+                )
+                for name, error in results:
+                    if error:
+                        failed += 1
+                        self.stderr.write(f'{name}: {error}')
+                    else:
+                        done += 1
+        # карточки с заглушками перерисуются с новыми srcset
+        self.touch_posts(options['batch_size'])
+        caching.bump_feeds(caching.ALL_FEEDS)
+        self.stdout.write(f'Обработано изображений: {done}, ошибок: {failed}')
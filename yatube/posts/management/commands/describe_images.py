@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import caching
+from posts.images import fill_image_preview
+from posts.models import Post
+
+FIELDS = ('image_placeholder', 'updated_at')
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет превью картинок у постов, загруженных до появления '
+        'этого поля.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.exclude(image='').filter(
+            image_placeholder=''
+        ).order_by('pk').only('pk', 'image')
+        last_pk = 0
+        done = failed = 0
+        while True:
+            posts = list(queryset.filter(pk__gt=last_pk)[
+                :options['chunk_size']
+            ])
+            if not posts:
+                break
+            last_pk = posts[-1].pk
+            described = []
+            for post in posts:
+                try:
+                    with post.image.open('rb') as file:
+                        fill_image_preview(post, file)
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                post.updated_at = timezone.now()
+                described.append(post)
+            Post.objects.bulk_update(described, FIELDS)
+            done += len(described)
+        if done:
+            # карточки перерисуются с превью
+            caching.bump_feeds(caching.ALL_FEEDS)
+        self.stdout.write(f'Описано картинок: {done}, ошибок: {failed}')
@@ -0,0 +1,316 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import caching, counters, feeds, search
+from posts.models import (
+    Comment, Follow, ImportCheckpoint, ImportedPost, Post, User,
+)
+from posts.services import cached_groups
+
+KINDS = ('posts', 'comments', 'follows')
+
+
+class SkipRecord(Exception):
+    '''Запись нельзя импортировать: она пропускается с сообщением.'''
+
+
+def read_records(file, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def parse_date(value):
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(str(value))
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise SkipRecord(f'неверная дата {value!r}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты, комментарии или подписки из NDJSON или CSV '
+        'пачками bulk_create в обход сигналов; счётчики, ленты и индекс '
+        'поиска исправляются после каждой пачки в той же транзакции. '
+        'В ней же сохраняются позиция и id постов из источника, и '
+        'прерванный импорт продолжается с позиции. Поля записей: '
+        'посты - author, text, group (slug), pub_date, id; '
+        'комментарии - post, author, text, pub_date; подписки - user, '
+        'author.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='по умолчанию - по расширению файла',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='имя позиции в БД, по умолчанию полный путь к файлу',
+        )
+        parser.add_argument(
+            '--source-ids', action='store_true',
+            help=(
+                'поле post комментариев - id поста в источнике, '
+                'сохранённый при импорте постов из их поля id'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        self.kind = options['kind']
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        self.checkpoint = options['checkpoint'] or os.path.abspath(path)
+        self.source_ids = options['source_ids']
+        position = self.read_checkpoint()
+        if position:
+            self.stdout.write(f'Продолжение с записи {position + 1}')
+        # ссылки разрешаются по словарям в памяти, а не запросом на запись
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = {group.slug: group.pk for group in cached_groups()}
+        self.source_posts = {}
+        if self.kind == 'comments' and self.source_ids:
+            self.source_posts = dict(
+                ImportedPost.objects.values_list('source_id', 'post_id')
+            )
+        build = getattr(self, f'build_{self.kind}')
+        self.imported = self.skipped = 0
+        batch = []
+        with open(path, newline='', encoding='utf-8') as file:
+            records = enumerate(read_records(file, file_format), 1)
+            for number, record in islice(records, position, None):
+                try:
+                    if not isinstance(record, dict):
+                        raise SkipRecord('не объект JSON')
+                    batch.append((number, *build(record)))
+                except SkipRecord as error:
+                    self.skip(number, error)
+                position = number
+                if len(batch) >= options['batch_size']:
+                    self.flush(batch, position)
+                    batch = []
+        self.flush(batch, position)
+        ImportCheckpoint.objects.filter(name=self.checkpoint).delete()
+        self.stdout.write(
+            f'Импортировано записей: {self.imported}, '
+            f'пропущено: {self.skipped}'
+        )
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        self.stderr.write(f'запись {number}: {reason}')
+
+    def read_checkpoint(self):
+        state = ImportCheckpoint.objects.filter(name=self.checkpoint).first()
+        if state is None:
+            return 0
+        if state.kind != self.kind:
+            raise CommandError(
+                f'позиция {self.checkpoint} сохранена для импорта '
+                f'{state.kind}'
+            )
+        return state.position
+
+    def flush(self, batch, position):
+        # позиция пишется в транзакции пачки: после сбоя пачка либо
+        # сохранена вместе с ней, либо будет прочитана заново
+        with transaction.atomic():
+            saved = []
+            if batch:
+                saved = getattr(self, f'save_{self.kind}')(batch)
+            ImportCheckpoint.objects.update_or_create(
+                name=self.checkpoint,
+                defaults={'kind': self.kind, 'position': position},
+            )
+        self.imported += len(saved)
+        if saved:
+            cache.delete(feeds.HEAVY_AUTHORS_KEY)
+            caching.bump_feeds(caching.ALL_FEEDS)
+
+    def user_id(self, record, field):
+        username = record.get(field)
+        if not isinstance(username, str) or username not in self.users:
+            raise SkipRecord(f'нет пользователя {username!r}')
+        return self.users[username]
+
+    def text(self, record):
+        text = record.get('text')
+        if not text or not isinstance(text, str):
+            raise SkipRecord('пустой текст')
+        return text
+
+    def build_posts(self, record):
+        slug = record.get('group')
+        if slug and (not isinstance(slug, str) or slug not in self.groups):
+            raise SkipRecord(f'нет группы {slug!r}')
+        post = Post(
+            author_id=self.user_id(record, 'author'),
+            group_id=self.groups.get(slug),
+            text=self.text(record),
+            pub_date=parse_date(record.get('pub_date')),
+        )
+        source_id = record.get('id')
+        if source_id is not None and source_id != '':
+            source_id = str(source_id)
+        else:
+            source_id = None
+        return post, source_id
+
+    def build_comments(self, record):
+        post = record.get('post')
+        if self.source_ids:
+            post_id = self.source_posts.get(str(post))
+        else:
+            try:
+                post_id = int(post)
+            except (TypeError, ValueError):
+                post_id = None
+        if post_id is None:
+            raise SkipRecord(f'нет поста {post!r}')
+        comment = Comment(
+            post_id=post_id,
+            author_id=self.user_id(record, 'author'),
+            text=self.text(record),
+            pub_date=parse_date(record.get('pub_date')),
+        )
+        return comment, None
+
+    def build_follows(self, record):
+        follow = Follow(
+            user_id=self.user_id(record, 'user'),
+            author_id=self.user_id(record, 'author'),
+        )
+        if follow.user_id == follow.author_id:
+            raise SkipRecord('подписка на себя')
+        return follow, None
+
+    def bulk_create(self, model, objs):
+        '''
+        bulk_create, после которого у объектов есть pk и pub_date
+        из источника.
+        '''
+        dates = [obj.pub_date for obj in objs]
+        last_pk = model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        model.objects.bulk_create(objs)
+        if not connection.features.can_return_ids_from_bulk_insert:
+            # sqlite не возвращает pk: строки пачки идут подряд после
+            # last_pk, пока транзакция держит блокировку записи
+            pks = list(model.objects.filter(pk__gt=last_pk).order_by(
+                'pk'
+            ).values_list('pk', flat=True))
+            if len(pks) != len(objs):
+                raise CommandError(
+                    f'{model._meta.verbose_name_plural}: таблицу меняли '
+                    f'во время импорта, пачка отменена'
+                )
+            for obj, pk in zip(objs, pks):
+                obj.pk = pk
+        # auto_now_add ставит текущее время и в bulk_create
+        dated = []
+        for obj, pub_date in zip(objs, dates):
+            if pub_date is not None:
+                obj.pub_date = pub_date
+                dated.append(obj)
+        model.objects.bulk_update(dated, ['pub_date'])
+
+    def save_posts(self, batch):
+        # уже импортированные по id источника посты не повторяются
+        seen = set(ImportedPost.objects.filter(
+            source_id__in={source for _, _, source in batch}
+        ).values_list('source_id', flat=True))
+        posts, sources = [], []
+        for number, post, source in batch:
+            if source in seen:
+                self.skip(number, f'пост {source!r} уже импортирован')
+                continue
+            if source is not None:
+                seen.add(source)
+                sources.append((source, post))
+            posts.append(post)
+        if not posts:
+            return posts
+        self.bulk_create(Post, posts)
+        ImportedPost.objects.bulk_create(
+            ImportedPost(source_id=source, post_id=post.pk)
+            for source, post in sources
+        )
+        stats = counters.recount_users({post.author_id for post in posts})
+        pulled = feeds.pulled_authors(stats)
+        feeds.fan_out_posts(
+            [post for post in posts if post.author_id not in pulled]
+        )
+        search.index_documents(posts, Post)
+        return posts
+
+    def save_comments(self, batch):
+        existing = set(Post.objects.filter(
+            pk__in={comment.post_id for _, comment, _ in batch}
+        ).values_list('pk', flat=True))
+        comments = []
+        for number, comment, _ in batch:
+            if comment.post_id in existing:
+                comments.append(comment)
+            else:
+                self.skip(number, f'нет поста {comment.post_id}')
+        if not comments:
+            return comments
+        self.bulk_create(Comment, comments)
+        post_ids = {comment.post_id for comment in comments}
+        counters.recount_posts(post_ids)
+        # карточки с прежним числом комментариев перерисуются
+        Post.objects.filter(pk__in=post_ids).update(
+            updated_at=timezone.now()
+        )
+        search.index_documents(comments, Comment)
+        return comments
+
+    def save_follows(self, batch):
+        user_ids = {follow.user_id for _, follow, _ in batch}
+        author_ids = {follow.author_id for _, follow, _ in batch}
+        pairs = set(Follow.objects.filter(
+            user_id__in=user_ids, author_id__in=author_ids
+        ).values_list('user_id', 'author_id'))
+        follows = []
+        for number, follow, _ in batch:
+            pair = (follow.user_id, follow.author_id)
+            if pair in pairs:
+                self.skip(number, 'подписка уже есть')
+                continue
+            pairs.add(pair)
+            follows.append(follow)
+        Follow.objects.bulk_create(follows)
+        stats = counters.recount_users(user_ids | author_ids)
+        pulled = feeds.pulled_authors(stats)
+        for follow in follows:
+            if follow.author_id not in pulled:
+                feeds.add_author(follow.user_id, follow.author_id)
+        return follows
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит заново индексы поиска и словарь основ слов. Нужна после '
+        'массовых правок текста через QuerySet.update() и bulk_create(), '
+        'которые не шлют сигналы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # каждый кусок фиксируется сам: сайт не ждёт всю перестройку
+        counts = search.rebuild(options['chunk_size'])
+        for model, count in counts.items():
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {count}'
+            )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает ленты подписок из Follow и Post. Сначала '
+        'возвращает к раскладке авторов, у которых подписчиков стало '
+        'меньше FEED_PUSH_RESUME_LIMIT, и докладывает их посты в ленты; '
+        'для этого команду с --trim-only запускают по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--trim-only',
+            action='store_true',
+            help='Только обрезать старые записи лент, не пересобирая их.',
+        )
+
+    def handle(self, *args, **options):
+        resumed = list(feeds.resumable_author_ids())
+        for author_id in resumed:
+            feeds.resume_push(author_id)
+        self.stdout.write(f'Возвращено к раскладке авторов: {len(resumed)}')
+        user_ids = list(feeds.timeline_user_ids())
+        if options['trim_only']:
+            trimmed = sum(feeds.trim_timeline(user_id) for user_id in user_ids)
+            self.stdout.write(f'Удалено записей: {trimmed}')
+            return
+        TimelineEntry.objects.exclude(user_id__in=user_ids).delete()
+        for user_id in user_ids:
+            feeds.rebuild_timeline(user_id)
+        self.stdout.write(f'Пересобрано лент: {len(user_ids)}')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def chunks(self, queryset, size):
+        last_pk = 0
+        while True:
+            pks = list(queryset.filter(pk__gt=last_pk).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:size])
+            if not pks:
+                return
+            yield pks
+            last_pk = pks[-1]
+
+    def handle(self, *args, **options):
+        size = options['chunk_size']
+        users = posts = 0
+        for pks in self.chunks(User.objects.all(), size):
+            users += len(counters.recount_users(pks))
+        for pks in self.chunks(Post.objects.all(), size):
+            posts += counters.recount_posts(pks)
+        self.stdout.write(
+            f'Пересчитано пользователей: {users}, постов: {posts}'
+        )
@@ -0,0 +1,55 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.storage import SHARD_RE, content_hash, sharded_name
+from posts import caching
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога posts/ в '
+        'подкаталоги из хеша содержимого и обновляет записи пачками. '
+        'Сайт может работать: новый файл появляется раньше, чем запись '
+        'начинает на него ссылаться.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--keep-old', action='store_true',
+            help='не удалять старые файлы (их ещё могут отдавать кеши)',
+        )
+
+    def handle(self, *args, **options):
+        flat = Post.objects.filter(image__startswith='posts/').exclude(
+            image__regex='^posts/' + SHARD_RE
+        ).order_by('image')
+        last_name = ''
+        moved = missing = 0
+        while True:
+            names = list(flat.filter(image__gt=last_name).values_list(
+                'image', flat=True
+            ).distinct()[:options['batch_size']])
+            if not names:
+                break
+            last_name = names[-1]
+            for name in names:
+                if not default_storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f'{name}: файла нет')
+                    continue
+                with default_storage.open(name, 'rb') as file:
+                    new_name = default_storage.save(
+                        sharded_name(name, content_hash(file)), file
+                    )
+                # запись с уже изменённой картинкой не трогаем
+                Post.objects.filter(image=name).update(
+                    image=new_name, updated_at=timezone.now()
+                )
+                if not options['keep_old']:
+                    default_storage.delete(name)
+                moved += 1
+            caching.bump_feeds(caching.ALL_FEEDS)
+        self.stdout.write(f'Перенесено файлов: {moved}, без файла: {missing}')
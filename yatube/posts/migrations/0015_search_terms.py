@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+def build_stems(apps, schema_editor):
+    from posts import search
+    search.install(schema_editor.connection)
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    for name in ('Post', 'Comment'):
+        search.rebuild_stems(
+            apps.get_model('posts', name), terms_model=SearchTerm,
+            using=schema_editor.connection,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.CharField(max_length=100, unique=True, verbose_name='Основа слова')),
+            ],
+            options={
+                'verbose_name': 'основа слова',
+                'verbose_name_plural': 'словарь поиска',
+            },
+        ),
+        migrations.RunPython(build_stems, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_userstats_feed_pulled'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Импорт')),
+                ('kind', models.CharField(max_length=20, verbose_name='Тип записей')),
+                ('position', models.PositiveIntegerField(default=0, verbose_name='Обработано записей')),
+            ],
+            options={
+                'verbose_name': 'позиция импорта',
+                'verbose_name_plural': 'позиции импорта',
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportedPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_id', models.CharField(max_length=255, unique=True, verbose_name='id в источнике')),
+            ],
+            options={
+                'verbose_name': 'импортированный пост',
+                'verbose_name_plural': 'импортированные посты',
+            },
+        ),
+        migrations.AddField(
+            model_name='importedpost',
+            name='post',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='import_source', to='posts.Post', verbose_name='Пост'),
+        ),
+    ]
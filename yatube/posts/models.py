@@ -42,6 +42,14 @@ class Post(CreatedModel):
         help_text='Группа, к которой будет относиться пост',
     )
     image = models.ImageField('Картинка', upload_to='posts/', blank=True)
+    # заполняется при загрузке, чтобы шаблоны не открывали файл
+    image_placeholder = models.TextField(
+        'Превью картинки', blank=True, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False
+    )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'посты'
@@ -76,6 +84,77 @@ class Comment(CreatedModel):
         verbose_name_plural = 'комментарии'
 
 
+class SearchTerm(models.Model):
+    # словарь основ слов из постов и комментариев (posts.search): по его
+    # триграммам ищутся похожие основы для запросов с опечатками
+    text = models.CharField('Основа слова', max_length=100, unique=True)
+
+    class Meta:
+        verbose_name = 'основа слова'
+        verbose_name_plural = 'словарь поиска'
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0, db_index=True
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    # посты автора читаются при чтении лент, а не раскладываются
+    # (posts.feeds); переключается с гистерезисом по followers_count
+    feed_pulled = models.BooleanField(
+        'Лента читается при чтении', default=False, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'счётчики пользователя'
+        verbose_name_plural = 'счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    # копия post.pub_date, чтобы лента читалась одним проходом по индексу
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+        ordering = ['-pub_date', '-pk']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_post',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date'],
+                name='posts_timeline_user_date',
+            ),
+        ]
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -97,3 +176,30 @@ class Follow(models.Model):
             fields=['user', 'author'],
             name='unique_follow',
         )
+
+
+# Состояние команды import_content: строки пишутся в транзакции пачки,
+# поэтому после сбоя позиция и соответствие id не расходятся с данными.
+
+class ImportCheckpoint(models.Model):
+    name = models.CharField('Импорт', max_length=255, unique=True)
+    kind = models.CharField('Тип записей', max_length=20)
+    position = models.PositiveIntegerField('Обработано записей', default=0)
+
+    class Meta:
+        verbose_name = 'позиция импорта'
+        verbose_name_plural = 'позиции импорта'
+
+
+class ImportedPost(models.Model):
+    source_id = models.CharField('id в источнике', max_length=255, unique=True)
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='import_source',
+        verbose_name='Пост',
+    )
+
+    class Meta:
+        verbose_name = 'импортированный пост'
+        verbose_name_plural = 'импортированные посты'
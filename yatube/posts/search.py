@@ -0,0 +1,438 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Comment, Post, SearchTerm
+from .services import FeedPaginator, elided_page_range, post_feed
+from .stemmer import stem
+
+# Полнотекстовые индексы SQLite FTS5.
+#
+# {таблица}_fts - слова текста постов и комментариев для поиска в
+# админке, и триграммы словаря основ SearchTerm. Это external content
+# таблицы: они хранят только токены, синхронность держат триггеры в БД,
+# поэтому индекс обновляется и при QuerySet.update(), bulk_create() и
+# удалении каскадом, которые не шлют сигналы.
+#
+# {таблица}_stems - основы слов (posts.stemmer) для публичного поиска.
+# Основы считает Python, поэтому их обновляют сигналы при сохранении
+# поста или комментария, а manage.py rebuild_search_index строит заново.
+# Таблицы созданы с detail=none: списки документов каждой основы -
+# только id с дельта-кодированием, без позиций.
+
+INDEXED = {
+    'posts_post': 'unicode61 remove_diacritics 2',
+    'posts_comment': 'unicode61 remove_diacritics 2',
+    'posts_searchterm': 'trigram',
+}
+STEMMED = ('posts_post', 'posts_comment')
+MAX_TERMS = 10
+# основы, встреченные при перестройке (rebuild), в таблице соединения
+SEEN_TERMS = 'temp.search_seen_terms'
+# слова длиннее - скорее ссылки и мусор, чем слова
+MAX_WORD_LENGTH = 50
+WORD_RE = re.compile(r'[^\W_]+')
+
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+    "text, content='{table}', content_rowid='id', tokenize='{tokenizer}')"
+)
+CREATE_STEMS = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5('
+    'stems, detail=none)'
+)
+# порядок и тексты триггеров из документации FTS5 для external content
+TRIGGERS = {
+    'ai': (
+        'AFTER INSERT ON {table} BEGIN '
+        'INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END'
+    ),
+    'ad': (
+        'AFTER DELETE ON {table} BEGIN '
+        "INSERT INTO {index}({index}, rowid, text) "
+        "VALUES ('delete', old.id, old.text); END"
+    ),
+    'au': (
+        'AFTER UPDATE OF text ON {table} BEGIN '
+        "INSERT INTO {index}({index}, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        'INSERT INTO {index}(rowid, text) VALUES (new.id, new.text); END'
+    ),
+}
+
+RANKED_POSTS = (
+    'SELECT post_id FROM ('
+    'SELECT rowid AS post_id, bm25(posts_post_stems) AS score '
+    'FROM posts_post_stems WHERE posts_post_stems MATCH %s '
+    'UNION ALL '
+    'SELECT c.post_id, bm25(posts_comment_stems) * %s '
+    'FROM posts_comment_stems '
+    'JOIN posts_comment c ON c.id = posts_comment_stems.rowid '
+    'WHERE posts_comment_stems MATCH %s'
+    ') GROUP BY post_id ORDER BY SUM(score), post_id DESC LIMIT %s'
+)
+SIMILAR_TERMS = (
+    'SELECT text FROM posts_searchterm_fts '
+    'WHERE posts_searchterm_fts MATCH %s ORDER BY rank LIMIT %s'
+)
+
+
+def fts_index(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def stems_index(model):
+    return f'{model._meta.db_table}_stems'
+
+
+def is_available(using=None):
+    return (using or connection).vendor == 'sqlite'
+
+
+def install(using=None):
+    '''
+    Создаёт таблицы индексов и триггеры, если их нет. Перестройка
+    таблицы в миграциях SQLite удаляет её триггеры, поэтому функция
+    вызывается и после каждого migrate; индекс, пропустивший изменения
+    без триггеров, строится заново.
+    '''
+    using = using or connection
+    if not is_available(using):
+        return
+    with using.cursor() as cursor:
+        tables = set(using.introspection.table_names(cursor))
+        for table in STEMMED:
+            if table in tables:
+                cursor.execute(CREATE_STEMS.format(index=f'{table}_stems'))
+        for table, tokenizer in INDEXED.items():
+            if table not in tables:
+                continue
+            names = {
+                'index': f'{table}_fts',
+                'table': table,
+                'tokenizer': tokenizer,
+            }
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                'AND tbl_name = %s', [table]
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = {
+                f'{table}_fts_{suffix}': sql
+                for suffix, sql in TRIGGERS.items()
+                if f'{table}_fts_{suffix}' not in existing
+            }
+            if not missing:
+                continue
+            cursor.execute(CREATE_TABLE.format(**names))
+            for name, sql in missing.items():
+                cursor.execute(
+                    f'CREATE TRIGGER {name} ' + sql.format(**names)
+                )
+            cursor.execute(
+                "INSERT INTO {index}({index}) VALUES ('rebuild')".format(
+                    **names
+                )
+            )
+
+
+def uninstall(using=None):
+    using = using or connection
+    if not is_available(using):
+        return
+    with using.cursor() as cursor:
+        for table in INDEXED:
+            for suffix in TRIGGERS:
+                cursor.execute(
+                    f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}'
+                )
+            cursor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+        for table in STEMMED:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}_stems')
+
+
+def words(text):
+    return [
+        word for word in WORD_RE.findall(text.lower())
+        if len(word) <= MAX_WORD_LENGTH
+    ]
+
+
+def stems(text):
+    return [stem(word) for word in words(text)]
+
+
+def index_documents(objects, model=None, terms_model=SearchTerm,
+                    using=None):
+    '''
+    Записывает основы слов постов или комментариев в индекс основ
+    (stems_index) и пополняет словарь SearchTerm новыми основами.
+    Возвращает множество основ; terms_model - модель словаря, using -
+    соединение (в миграции - историческая модель и соединение
+    schema_editor).
+    '''
+    objects = list(objects)
+    using = using or connection
+    if not objects or not is_available(using):
+        return set()
+    index = stems_index(model or type(objects[0]))
+    rows = [(obj.pk, ' '.join(stems(obj.text))) for obj in objects]
+    with using.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {index} WHERE rowid = %s',
+            [(pk,) for pk, _ in rows],
+        )
+        cursor.executemany(
+            f'INSERT INTO {index}(rowid, stems) VALUES (%s, %s)', rows
+        )
+    terms = {term for _, text in rows for term in text.split()}
+    terms_model.objects.using(using.alias).bulk_create(
+        [terms_model(text=term) for term in terms], ignore_conflicts=True
+    )
+    return terms
+
+
+def unindex_documents(model, pks):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {stems_index(model)} WHERE rowid = %s',
+            [(pk,) for pk in pks],
+        )
+
+
+def rebuild_stems(model, chunk_size=1000, terms_model=SearchTerm,
+                  mark_seen=False, using=None):
+    '''
+    Заново индексирует все записи model кусками по chunk_size, каждый
+    в своей транзакции: запись постов и комментариев ждёт один кусок,
+    а не всю перестройку, и поиск всё это время работает. mark_seen -
+    отмечать встреченные основы в SEEN_TERMS для чистки словаря; using -
+    соединение, через которое идут чтение и запись.
+    '''
+    using = using or connection
+    if not is_available(using):
+        return 0
+    queryset = model.objects.using(using.alias).only('text').order_by('pk')
+    last_pk = 0
+    total = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        with transaction.atomic(using=using.alias):
+            terms = index_documents(chunk, model, terms_model, using)
+            if mark_seen:
+                with using.cursor() as cursor:
+                    cursor.executemany(
+                        f'INSERT OR IGNORE INTO {SEEN_TERMS} VALUES (%s)',
+                        [(term,) for term in terms],
+                    )
+        last_pk = chunk[-1].pk
+        total += len(chunk)
+    # записи, удалённые без сигналов
+    with using.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {stems_index(model)} WHERE rowid NOT IN '
+            f'(SELECT id FROM {model._meta.db_table})'
+        )
+    return total
+
+
+def rebuild(chunk_size=1000):
+    '''
+    Строит все индексы заново и удаляет из словаря основы, которых нет
+    ни в одном тексте. Основы пересчитываются кусками (rebuild_stems),
+    словарь чистится в конце и только от основ, добавленных до начала
+    перестройки. Возвращает число проиндексированных записей.
+    '''
+    install()
+    if not is_available():
+        return {}
+    last_term = SearchTerm.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    ).first() or 0
+    with connection.cursor() as cursor:
+        # каждая команда rebuild FTS5 - одна инструкция в своей транзакции
+        for table in INDEXED:
+            cursor.execute(
+                f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"
+            )
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {SEEN_TERMS} '
+            '(text TEXT PRIMARY KEY)'
+        )
+        cursor.execute(f'DELETE FROM {SEEN_TERMS}')
+    counts = {
+        model: rebuild_stems(model, chunk_size, mark_seen=True)
+        for model in (Post, Comment)
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SearchTerm._meta.db_table} WHERE id <= %s '
+            f'AND text NOT IN (SELECT text FROM {SEEN_TERMS})',
+            [last_term],
+        )
+        cursor.execute(f'DROP TABLE {SEEN_TERMS}')
+    return counts
+
+
+def trigrams(term):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def edit_distance(first, second, limit):
+    '''Расстояние Левенштейна или limit + 1, если оно больше limit.'''
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = list(range(len(second) + 1))
+    for i, char in enumerate(first, 1):
+        current = [i]
+        for j, other in enumerate(second, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char != other),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def max_typos(term):
+    return 1 if len(term) < settings.SEARCH_TWO_TYPOS_LENGTH else 2
+
+
+def similar_terms(terms):
+    '''
+    Для каждой основы из terms - известные основы не дальше max_typos
+    правок, ближайшие первыми. Кандидаты на все основы выбираются одним
+    запросом к триграммному индексу словаря.
+    '''
+    grams = set().union(*(trigrams(term) for term in terms))
+    if not grams:
+        return {term: [] for term in terms}
+    with connection.cursor() as cursor:
+        cursor.execute(SIMILAR_TERMS, [
+            ' OR '.join(f'"{gram}"' for gram in sorted(grams)),
+            settings.SEARCH_FUZZY_CANDIDATES * len(terms),
+        ])
+        candidates = [row[0] for row in cursor.fetchall()]
+    similar = {}
+    for term in terms:
+        limit = max_typos(term)
+        scored = sorted(
+            (edit_distance(term, candidate, limit), candidate)
+            for candidate in candidates
+        )
+        similar[term] = [
+            candidate for distance, candidate in scored if distance <= limit
+        ][:settings.SEARCH_FUZZY_TERMS]
+    return similar
+
+
+def expand_query(query):
+    '''
+    Основы слов запроса с вариантами: известная основа ищется как есть,
+    неизвестная (опечатка, редкая форма) заменяется похожими основами
+    из словаря. Слова, для которых ничего не нашлось, отбрасываются:
+    ни один текст их всё равно не содержит.
+    '''
+    terms = list(dict.fromkeys(stems(query)))[:MAX_TERMS]
+    if not terms:
+        return []
+    known = set(SearchTerm.objects.filter(
+        text__in=terms
+    ).values_list('text', flat=True))
+    unknown = [term for term in terms if term not in known]
+    similar = similar_terms(unknown) if unknown else {}
+    groups = [[term] if term in known else similar[term] for term in terms]
+    return [group for group in groups if group]
+
+
+def match_expression(query):
+    '''
+    Запрос пользователя в синтаксисе MATCH для поиска в админке: слова
+    в кавычках (операторы FTS5 не интерпретируются) с поиском по началу
+    слова, все слова обязательны. Пустая строка, если слов нет.
+    '''
+    terms = words(query)[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def stems_expression(query):
+    '''
+    MATCH по основам: каждое слово запроса обязательно, любой из его
+    вариантов подходит. Пустая строка, если искать нечего.
+    '''
+    groups = expand_query(query)
+    if not groups:
+        return ''
+    return ' AND '.join(
+        '(' + ' OR '.join(f'"{term}"' for term in group) + ')'
+        for group in groups
+    )
+
+
+def filter_matching(queryset, query):
+    '''
+    Записи queryset (посты или комментарии), текст которых подходит под
+    запрос, одним подзапросом к индексу. Порядок queryset не меняется.
+    '''
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    index = fts_index(queryset.model)
+    # pk__in=RawSQL(...) SQLite читает как IN ((...)) и берёт лишь
+    # первую строку подзапроса
+    return queryset.extra(
+        where=[
+            f'"{queryset.model._meta.db_table}"."id" IN '
+            f'(SELECT rowid FROM {index} WHERE {index} MATCH %s)'
+        ],
+        params=[expression],
+    )
+
+
+def ranked_post_ids(query, limit=None):
+    '''
+    id постов по убыванию релевантности (bm25) поиска по основам слов:
+    совпадения в тексте поста и в его комментариях складываются,
+    комментарии весят SEARCH_COMMENT_WEIGHT от поста.
+    '''
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    if not is_available():
+        if not words(query):
+            return []
+        return list(Post.objects.filter(
+            text__icontains=query
+        ).order_by('-pub_date').values_list('pk', flat=True)[:limit])
+    expression = stems_expression(query)
+    if not expression:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(RANKED_POSTS, [
+            expression, settings.SEARCH_COMMENT_WEIGHT, expression, limit,
+        ])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_page(request, query):
+    '''
+    Страница ?page= результатов поиска. Ранжированный список id
+    ограничен SEARCH_MAX_RESULTS и листается по номерам, посты
+    выбираются только для текущей страницы.
+    '''
+    paginator = FeedPaginator(
+        ranked_post_ids(query), settings.MAX_POSTS_IN_PAGE
+    )
+    page = paginator.get_page(request.GET.get('page'))
+    posts = post_feed().in_bulk(page.object_list)
+    page.object_list = [
+        posts[pk] for pk in page.object_list if pk in posts
+    ]
+    page.elided_range = elided_page_range(page.number, paginator.num_pages)
+    return page
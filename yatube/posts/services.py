@@ -1,8 +1,347 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import (
+    EmptyPage, Page, PageNotAnInteger, Paginator
+)
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .models import Group, Post
+
+COUNT_EXACT = 'exact'
+COUNT_CACHED = 'cached'
+COUNT_NONE = 'none'
+
+
+def post_feed(queryset=None):
+    '''
+    Посты для ленты вместе со всем, что читает карточка поста
+    (posts/includes/post.html): автором и группой.
+    '''
+    if queryset is None:
+        queryset = Post.objects.all()
+    return queryset.select_related('author', 'group')
+
+
+def comment_feed(queryset):
+    return queryset.select_related('author')
+
+
+GROUPS_KEY = 'groups:all'
+
+
+def cached_groups():
+    '''
+    Все группы в порядке id. Список живёт в кеше GROUPS_CACHE_TIMEOUT
+    и сбрасывается сигналами при сохранении и удалении групп.
+    '''
+    return cache.get_or_set(
+        GROUPS_KEY,
+        lambda: list(Group.objects.order_by('pk')),
+        settings.GROUPS_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_groups():
+    cache.delete(GROUPS_KEY)
+
+
+class CachedGroupQuerySet(QuerySet):
+    '''
+    Группы, у которых get() по pk берёт объект из cached_groups() без
+    запроса к БД. Queryset поля group формы поста: ModelChoiceField
+    проверяет выбор через queryset.get(pk=...).
+    '''
+
+    def __init__(self, model=Group, **kwargs):
+        super().__init__(model, **kwargs)
+
+    def get(self, *args, **kwargs):
+        if args or self.query.where or list(kwargs) not in (['pk'], ['id']):
+            return super().get(*args, **kwargs)
+        # как и в БД, ValueError/TypeError для значения не того типа
+        pk = int(*kwargs.values())
+        for group in cached_groups():
+            if group.pk == pk:
+                return group
+        raise self.model.DoesNotExist(
+            f'{self.model._meta.object_name} matching query does not exist.'
+        )
+
+
+def count_key(feed, pk=None):
+    return f'count:{feed}' if pk is None else f'count:{feed}:{pk}'
+
+
+def cached_count(queryset, feed, pk=None):
+    '''
+    COUNT(*) ленты, закешированный на PAGINATOR_COUNT_TTL. Ключи
+    сбрасываются сигналами при сохранении и удалении постов.
+    '''
+    return cache.get_or_set(
+        count_key(feed, pk), queryset.count, settings.PAGINATOR_COUNT_TTL
+    )
+
+
+def invalidate_post_counts(post, old_group_id=None, old_author_id=None):
+    keys = [count_key('index')]
+    for author_id in {post.author_id, old_author_id} - {None}:
+        keys.append(count_key('profile', author_id))
+    for group_id in {post.group_id, old_group_id} - {None}:
+        keys.append(count_key('group', group_id))
+    cache.delete_many(keys)
+
+
+def encode_cursor(obj):
+    '''Упаковывает (pub_date, id) записи в непрозрачный токен для URL.'''
+    raw = f'{obj.pub_date.isoformat()}|{obj.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    '''Возвращает (pub_date, id) из токена или None, если токен битый.'''
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, pk = raw.decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    '''
+    Keyset-пагинация по (pub_date, id): страница выбирается условием
+    WHERE по индексу вместо OFFSET, поэтому глубокие страницы стоят
+    столько же, сколько первая.
+
+    Возвращает обычный Page. number и num_pages вычисляются по соседям
+    текущей страницы без COUNT(*), поэтому has_next/has_previous
+    работают, а page_range смысла не имеет.
+    '''
+
+    is_counted = False
+
+    def __init__(self, object_list, per_page):
+        super().__init__(
+            object_list.order_by('-pub_date', '-pk'), per_page
+        )
+        self._has_next = False
+        self._has_previous = False
+
+    @property
+    def num_pages(self):
+        return int(self._has_previous) + 1 + int(self._has_next)
+
+    @staticmethod
+    def slice(queryset, cursor, backwards, limit, key=('pub_date', 'pk')):
+        '''
+        Выбирает limit записей строго после курсора (или до него при
+        backwards) в порядке обхода, сортируя по паре полей key.
+        '''
+        date_field, id_field = key
+        lookup = 'gt' if backwards else 'lt'
+        if backwards:
+            queryset = queryset.order_by(date_field, id_field)
+        else:
+            queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+        if cursor:
+            pub_date, pk = cursor
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__{lookup}': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk})
+            )
+        return list(queryset[:limit])
+
+    def fetch(self, cursor, backwards, limit):
+        return self.slice(self.object_list, cursor, backwards, limit)
+
+    def get_cursor_page(self, after=None, before=None):
+        after = decode_cursor(after)
+        before = None if after else decode_cursor(before)
+        # лишняя запись показывает, есть ли страница дальше
+        items = self.fetch(before or after, bool(before), self.per_page + 1)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if before:
+            items.reverse()
+            self._has_next, self._has_previous = True, has_more
+        else:
+            self._has_next, self._has_previous = has_more, bool(after)
+        page = Page(items, 1 + int(self._has_previous), self)
+        page.is_cursor = True
+        page.next_cursor = (
+            encode_cursor(items[-1]) if self._has_next and items else None
+        )
+        page.previous_cursor = (
+            encode_cursor(items[0]) if self._has_previous and items else None
+        )
+        return page
+
+
+class FeedPaginator(Paginator):
+    '''
+    Paginator с выбором способа подсчёта записей (total, если
+    известен заранее, например из счётчиков, заменяет подсчёт):
+    COUNT_EXACT - обычный COUNT(*) на каждый запрос;
+    COUNT_CACHED - COUNT(*) из кеша по ключу (feed, pk);
+    COUNT_NONE - без подсчёта, страница выбирается с одной лишней
+    записью, чтобы узнать, есть ли следующая.
+    '''
+
+    def __init__(self, object_list, per_page, count=COUNT_EXACT,
+                 feed=None, pk=None, total=None):
+        super().__init__(object_list, per_page)
+        self.count_strategy = count
+        self.total = total
+        self.feed = feed
+        self.feed_pk = pk
+        self._number = 1
+        self._has_next = False
+
+    @property
+    def is_counted(self):
+        return self.count_strategy != COUNT_NONE
+
+    @cached_property
+    def count(self):
+        if self.total is not None:
+            return self.total
+        if self.count_strategy == COUNT_CACHED and self.feed:
+            return cached_count(self.object_list, self.feed, self.feed_pk)
+        return super().count
+
+    @property
+    def num_pages(self):
+        if self.is_counted:
+            return super().num_pages
+        return self._number + int(self._has_next)
+
+    def get_page(self, number):
+        if self.is_counted:
+            return super().get_page(number)
+        try:
+            return self.page(number)
+        except (PageNotAnInteger, EmptyPage):
+            return self.page(1)
+
+    def page(self, number):
+        if self.is_counted:
+            return super().page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage('That page contains no results')
+        self._number = number
+        self._has_next = len(items) > self.per_page
+        return self._get_page(items[:self.per_page], number, self)
+
+
+def estimated_count(queryset):
+    '''
+    Оценка числа строк таблицы queryset по диапазону первичных ключей:
+    два чтения с краёв индекса вместо COUNT(*) по всей таблице.
+    Удалённые строки оценку завышают.
+    '''
+    pks = queryset.model._default_manager.order_by('pk').values_list(
+        'pk', flat=True
+    )
+    first, last = pks.first(), pks.last()
+    if first is None:
+        return 0
+    return last - first + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    '''
+    Paginator для списков админки: записи считаются точно, только пока
+    их не больше limit (COUNT(*) по подзапросу с LIMIT). Дальше для всей
+    таблицы берётся estimated_count, а у отфильтрованного списка число
+    останавливается на limit и ставится capped - шаблоны админки
+    показывают его как «limit+». Страницы за реальным концом списка
+    пустые.
+    '''
+
+    limit = 10000
+    capped = False
+
+    @cached_property
+    def count(self):
+        count = self.object_list.order_by().values('pk')[
+            :self.limit + 1
+        ].count()
+        if count <= self.limit:
+            return count
+        if not self.object_list.query.where:
+            return max(count, estimated_count(self.object_list))
+        # диапазон ключей оценивает таблицу, а не выборку фильтра
+        self.capped = True
+        return self.limit
+
+
+ELLIPSIS = '…'
+
+
+def elided_page_range(number, num_pages, on_each_side=2, on_ends=1):
+    '''
+    Номера страниц для навигации: on_ends с краёв и on_each_side вокруг
+    текущей, пропуски заменены на ELLIPSIS. Длина списка не зависит от
+    числа страниц.
+    '''
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > on_each_side + on_ends + 1:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(ELLIPSIS)
+        start = number - on_each_side
+    else:
+        start = 1
+    if number < num_pages - on_each_side - on_ends:
+        pages.extend(range(start, number + on_each_side + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(start, num_pages + 1))
+    return pages
 
 
-def paging(request, list):
-    paginator = Paginator(list, settings.MAX_POSTS_IN_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def paging(request, list, feed=None, pk=None, total=None,
+           cursor_paginator=CursorPaginator):
+    # ?page= оставлен для старых ссылок, остальное листается курсором
+    if 'page' in request.GET:
+        paginator = FeedPaginator(
+            list,
+            settings.MAX_POSTS_IN_PAGE,
+            count=settings.PAGINATOR_COUNT.get(feed, COUNT_EXACT),
+            feed=feed,
+            pk=pk,
+            total=total,
+        )
+        page_number = request.GET.get('page')
+        page = paginator.get_page(page_number)
+        if paginator.is_counted:
+            page.elided_range = elided_page_range(
+                page.number, paginator.num_pages
+            )
+        return page
+    paginator = cursor_paginator(list, settings.MAX_POSTS_IN_PAGE)
+    return paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
@@ -0,0 +1,117 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, feeds, search, services, thumbnails
+from .models import Comment, Follow, Group, Post, User
+
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # при смене группы нужно сбросить счётчик и у старой группы,
+    # при смене автора - перенести пост между счётчиками, профилями и
+    # лентами, при смене картинки - подготовить новые миниатюры, при
+    # смене текста - обновить индекс поиска
+    old = None
+    if instance.pk:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'author_id', 'image', 'text'
+        ).first()
+    (
+        instance._old_group_id, instance._old_author_id,
+        instance._old_image, instance._old_text,
+    ) = old or (None, None, None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    old_author_id = getattr(instance, '_old_author_id', None)
+    services.invalidate_post_counts(instance, old_group_id, old_author_id)
+    caching.invalidate_post(instance, old_group_id, old_author_id)
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        feeds.post_published(instance)
+    elif old_author_id not in (None, instance.author_id):
+        counters.bump_user(old_author_id, posts_count=-1)
+        counters.bump_user(instance.author_id, posts_count=1)
+        feeds.post_reassigned(instance)
+    if instance.image and instance.image.name != getattr(
+        instance, '_old_image', None
+    ):
+        thumbnails.schedule(instance.image.name)
+    if instance.text != getattr(instance, '_old_text', None):
+        search.index_documents([instance])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    services.invalidate_post_counts(instance)
+    caching.invalidate_post(instance)
+    search.unindex_documents(Post, [instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+        caching.invalidate_post(instance.post)
+    search.index_documents([instance])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    caching.invalidate_post(instance.post)
+    search.unindex_documents(Comment, [instance.pk])
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.user_id, following_count=1)
+        counters.bump_user(instance.author_id, followers_count=1)
+        caching.bump_feeds(caching.profile_feed(instance.author.username))
+        feeds.author_followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.user_id, following_count=-1)
+    counters.bump_user(instance.author_id, followers_count=-1)
+    caching.bump_feeds(caching.profile_feed(instance.author.username))
+    feeds.author_unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # ссылки на группу есть в карточках постов во всех лентах
+    caching.bump_feeds(caching.ALL_FEEDS)
+    services.invalidate_groups()
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    # вход обновляет только last_login: имя тогда не перечитывается
+    instance._old_names = None
+    if instance.pk and (
+        update_fields is None
+        or set(update_fields) & set(USER_NAME_FIELDS)
+    ):
+        instance._old_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # имя автора есть в карточках его постов и в комментариях во всех
+    # лентах; ALL_FEEDS входит и в ключи карточек, и в ETag страниц
+    old = getattr(instance, '_old_names', None)
+    if created or old is None:
+        return
+    if old != tuple(getattr(instance, name) for name in USER_NAME_FIELDS):
+        caching.bump_feeds(caching.ALL_FEEDS)
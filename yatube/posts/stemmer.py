@@ -0,0 +1,117 @@
+'''
+Стеммер Snowball для русского языка
+(https://snowballstem.org/algorithms/russian/stemmer.html): отрезает
+окончания, чтобы разные формы слова давали одну основу.
+'''
+
+from functools import lru_cache
+
+VOWELS = set('аеиоуыэюя')
+
+# окончания групп 1 удаляются, только если перед ними а или я
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = ((
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+    'ют', 'ны', 'ть', 'ешь', 'нно',
+), (
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+    'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+    'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+))
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+MAX_ENDING = 6
+
+
+def _regions(word):
+    '''
+    Начала областей RV (после первой гласной) и R2 (R1 от R1, где R1 -
+    после первой согласной, идущей за гласной).
+    '''
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, groups):
+    '''
+    Отрезает самое длинное окончание из groups, лежащее после start;
+    None, если окончания нет или окончанию группы 1 не предшествует
+    а или я (как в Snowball, более короткие окончания тогда не ищутся).
+    '''
+    conditional, plain = groups
+    for length in range(min(MAX_ENDING, len(word) - start), 0, -1):
+        ending = word[-length:]
+        rest = word[:-length]
+        if ending in plain:
+            return rest
+        if ending in conditional:
+            if len(rest) > start and rest[-1] in 'ая':
+                return rest
+            return None
+    return None
+
+
+def _strip_adjectival(word, start):
+    word = _strip(word, start, ADJECTIVE)
+    if word is None:
+        return None
+    return _strip(word, start, PARTICIPLE) or word
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    # слова в текстах повторяются, так что почти все основы - из кеша
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    # шаг 1
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        stripped = (
+            _strip_adjectival(word, rv)
+            or _strip(word, rv, VERB)
+            or _strip(word, rv, NOUN)
+        )
+    word = stripped or word
+    # шаг 2
+    if word[rv:].endswith('и'):
+        word = word[:-1]
+    # шаг 3
+    word = _strip(word, max(r2, rv), DERIVATIONAL) or word
+    # шаг 4
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+    if word[rv:].endswith('нн'):
+        word = word[:-1]
+    elif superlative is None and word[rv:].endswith('ь'):
+        word = word[:-1]
+    return word
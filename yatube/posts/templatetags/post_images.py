@@ -0,0 +1,13 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    # миниатюры страницы ленты заранее выбраны thumbnails.prefetch
+    if hasattr(post, 'thumbnail'):
+        return post.thumbnail
+    return thumbnails.thumbnail(post.image)
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..admin import ChangeListQuerySet
+from ..models import Comment, Group, Post
+from ..services import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangeListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {n}', slug=f'group-{n}', description='-'
+            )
+            for n in range(3)
+        ]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create_posts(self, count):
+        for n in range(count):
+            post = Post.objects.create(
+                text=f'Пост {n}', author=self.admin,
+                group=self.groups[n % len(self.groups)],
+            )
+            Comment.objects.create(
+                post=post, author=self.admin, text=f'Комментарий {n}'
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        '''Число запросов списка не зависит от числа строк на странице.'''
+        for name in ('posts_post', 'posts_comment'):
+            with self.subTest(name=name):
+                Post.objects.all().delete()
+                url = reverse(f'admin:{name}_changelist')
+                self.create_posts(2)
+                few = self.count_queries(url)
+                self.create_posts(10)
+                self.assertEqual(self.count_queries(url), few)
+
+    def test_list_editable_group_is_autocomplete(self):
+        '''В строке только выбранная группа, а не <select> со всеми.'''
+        Post.objects.create(
+            text='Пост', author=self.admin, group=self.groups[0]
+        )
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, 'Группа 0</option>', count=1)
+        self.assertNotContains(response, 'Группа 1</option>')
+
+    def test_dates_follow_queryset_dates(self):
+        '''Навигация по датам совпадает с QuerySet.dates() и aggregate().'''
+        start = timezone.make_aware(datetime(2020, 12, 30, 23))
+        for hours in (0, 2, 30, 24 * 40, 24 * 400):
+            post = Post.objects.create(text='Пост', author=self.admin)
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=start + timedelta(hours=hours)
+            )
+        queryset = ChangeListQuerySet(Post)
+        for kind in ('year', 'month', 'day'):
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    queryset.dates('pub_date', kind, order='DESC'),
+                    list(Post.objects.dates('pub_date', kind, 'DESC')),
+                )
+        edges = {'first': Min('pub_date'), 'last': Max('pub_date')}
+        self.assertEqual(
+            queryset.aggregate(**edges), Post.objects.aggregate(**edges)
+        )
+
+    def test_estimated_count(self):
+        '''Больше limit записей оцениваются по диапазону ключей.'''
+        self.create_posts(5)
+        Post.objects.filter(pk=Post.objects.order_by('pk')[1].pk).delete()
+        queryset = Post.objects.all()
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 4)
+
+        class SmallLimitPaginator(EstimatedCountPaginator):
+            limit = 2
+
+        self.assertEqual(SmallLimitPaginator(queryset, 2).count, 5)
+
+    def test_filtered_count_capped(self):
+        '''Отфильтрованный список не оценивается по всей таблице.'''
+        self.create_posts(5)
+        queryset = Post.objects.filter(group=self.groups[0])
+
+        class SmallLimitPaginator(EstimatedCountPaginator):
+            limit = 1
+
+        paginator = SmallLimitPaginator(queryset, 2)
+        self.assertEqual(paginator.count, 1)
+        self.assertTrue(paginator.capped)
+        self.assertFalse(SmallLimitPaginator(Post.objects.all(), 2).capped)
+
+        self.addCleanup(
+            setattr, EstimatedCountPaginator, 'limit',
+            EstimatedCountPaginator.limit,
+        )
+        EstimatedCountPaginator.limit = 2
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'Пост'}
+        )
+        self.assertContains(response, '2+ посты', count=2)
@@ -3,7 +3,8 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from django.core.cache import cache
 
-from ..models import Post, Group
+from ..caching import attach_cards
+from ..models import Comment, Group, Post
 
 User = get_user_model()
 
@@ -25,6 +26,7 @@ class CacheTests(TestCase):
 
     def setUp(self):
         cache.clear()
+        self.guest_client = Client()
         self.user = self.test_user
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -32,13 +34,82 @@ class CacheTests(TestCase):
     def test_cache(self):
         '''Проверяет кеширование страницы index.'''
         response1 = self.authorized_client.get(reverse('posts:index'))
+        response2 = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response1.content, response2.content)
         Post.objects.create(
             text='Новый пост',
             author=self.test_user,
             group=self.group,
         )
-        response2 = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(response1.content, response2.content)
-        cache.clear()
         response3 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response3.content, response2.content)
+        self.assertIn('Новый пост', response3.content.decode())
+
+    def test_cached_page_skips_database(self):
+        '''Повторный запрос ленты без изменений не обращается к БД.'''
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'test1'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    self.guest_client.get(url)
+
+    def test_versions_bumped_by_changes(self):
+        '''Изменения поста, комментария и группы сбрасывают ленты.'''
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        post = Post.objects.create(
+            text='Пост', author=self.test_user, group=self.group
+        )
+        changes = [
+            lambda: Comment.objects.create(
+                post=post, author=self.test_user, text='Комментарий'
+            ),
+            lambda: self.group.save(),
+            lambda: post.delete(),
+        ]
+        for change in changes:
+            self.guest_client.get(url)
+            change()
+            with self.assertNumQueries(2):
+                self.guest_client.get(url)
+
+    def test_post_cards_cached_until_post_changes(self):
+        '''Карточка поста берётся из кеша, пока пост не изменится.'''
+        post = Post.objects.create(text='Пост', author=self.test_user)
+        card = attach_cards([post])[0].card
+        self.assertIn('Пост', card)
+        post.text = 'Изменённый пост'
+        self.assertEqual(attach_cards([post])[0].card, card)
+        post.save()
+        post.refresh_from_db()
+        self.assertIn('Изменённый пост', attach_cards([post])[0].card)
+        Comment.objects.create(post=post, author=self.test_user, text='К')
+        post.refresh_from_db()
+        self.assertIn('Комментариев: 1', attach_cards([post])[0].card)
+
+    def test_post_cards_follow_author_name(self):
+        '''Смена имени автора сбрасывает карточки его постов.'''
+        post = Post.objects.create(text='Пост', author=self.test_user)
+        self.guest_client.get(reverse('posts:index'))
+        self.assertNotIn('Иван Петров', attach_cards([post])[0].card)
+        self.test_user.first_name = 'Иван'
+        self.test_user.last_name = 'Петров'
+        self.test_user.save()
+        self.assertIn('Иван Петров', attach_cards([post])[0].card)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Иван Петров')
+
+    def test_login_keeps_feeds(self):
+        '''Сохранение пользователя без смены имени не сбрасывает ленты.'''
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        self.test_user.last_login = None
+        self.test_user.save(update_fields=['last_login'])
+        self.test_user.email = 'new@test.ru'
+        self.test_user.save()
+        with self.assertNumQueries(0):
+            self.guest_client.get(url)
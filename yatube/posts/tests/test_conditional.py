@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from core.cache.stampede import LOCK_KEY
+
+from ..caching import page_key
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_feeds_not_modified(self):
+        '''Неизменившаяся лента отдаёт 304 без запросов к БД.'''
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_etag(self):
+        '''Новый пост и новый комментарий меняют ETag.'''
+        index = reverse('posts:index')
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        index_etag = self.guest_client.get(index)['ETag']
+        detail_etag = self.guest_client.get(detail)['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                detail, HTTP_IF_NONE_MATCH=detail_etag
+            )
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.author)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        for url, etag in ((index, index_etag), (detail, detail_etag)):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_author_rename_invalidates_etag(self):
+        '''После смены имени автора страницы отдаются заново с ним.'''
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        etags = [self.guest_client.get(url)['ETag'] for url in urls]
+        self.author.first_name = 'Новое'
+        self.author.last_name = 'Имя'
+        self.author.save()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Новое Имя')
+
+    def test_authenticated_variant_has_own_etag(self):
+        '''Гость и пользователь получают разные ETag одной страницы.'''
+        url = reverse('posts:index')
+        guest_etag = self.guest_client.get(url)['ETag']
+        response = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=guest_etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], guest_etag)
+        self.assertEqual(
+            self.revalidate(self.authorized_client, url).status_code, 304
+        )
+
+    def test_stale_copy_keeps_its_etag(self):
+        '''
+        Прежняя копия ленты, отданная, пока страницу пересобирает другой
+        процесс, приходит со своим ETag, и по нему не отдаётся 304.
+        '''
+        url = reverse('posts:index')
+        old = self.guest_client.get(url)
+        key = page_key(RequestFactory().get(url), 'index')
+        cache.add(LOCK_KEY.format(key), 'other-worker')
+        Post.objects.create(text='Новый пост', author=self.author)
+        stale = self.guest_client.get(url)
+        self.assertNotContains(stale, 'Новый пост')
+        self.assertEqual(stale['ETag'], old['ETag'])
+        response = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=stale['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        cache.delete(LOCK_KEY.format(key))
+        fresh = self.guest_client.get(url)
+        self.assertContains(fresh, 'Новый пост')
+        self.assertNotEqual(fresh['ETag'], old['ETag'])
+        response = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=fresh['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
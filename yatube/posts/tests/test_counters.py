@@ -0,0 +1,80 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..counters import user_stats
+from ..models import Comment, Follow, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_follow_writes(self):
+        '''Счётчики меняются при создании и удалении записей.'''
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.create(text='Ещё пост', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        Follow.objects.create(user=self.reader, author=self.author)
+        stats = user_stats(self.author.pk)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(user_stats(self.reader.pk).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.all().delete()
+        Follow.objects.all().delete()
+        post.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(user_stats(self.reader.pk).following_count, 0)
+
+    def test_author_change_moves_post(self):
+        '''Смена автора поста переносит его счётчик, профиль и ленты.'''
+        other = User.objects.create_user(username='other')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=other)
+        post = Post.objects.create(text='Чужой пост', author=self.author)
+        client = Client()
+        old_profile = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertContains(client.get(old_profile), 'Чужой пост')
+        post.author = other
+        post.save()
+        self.assertEqual(user_stats(self.author.pk).posts_count, 0)
+        self.assertEqual(user_stats(other.pk).posts_count, 1)
+        self.assertNotContains(client.get(old_profile), 'Чужой пост')
+        self.assertContains(
+            client.get(reverse('posts:profile', kwargs={'username': 'other'})),
+            'Чужой пост',
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(post=post).values_list(
+                'user', flat=True
+            )),
+            [fan.pk],
+        )
+
+    def test_recount_repairs_drift(self):
+        '''Команда recount исправляет разошедшиеся счётчики.'''
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        call_command('recount', '--chunk-size=1', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(user_stats(self.author.pk).posts_count, 1)
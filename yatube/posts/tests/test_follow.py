@@ -1,8 +1,13 @@
+from io import StringIO
+
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 
-from ..models import Follow, Post
+from ..models import Follow, Post, TimelineEntry
 
 User = get_user_model()
 
@@ -23,6 +28,7 @@ class FollowTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.user1 = self.test_user1
         self.authorized_client1 = Client()
         self.authorized_client1.force_login(self.user1)
@@ -77,3 +83,93 @@ class FollowTests(TestCase):
         self.assertEqual(new_post, latest_post)
         response = self.authorized_client1.get(reverse('posts:follow_index'))
         self.assertNotIn(new_post, response.context['page_obj'])
+
+    def test_timeline_follows_subscriptions(self):
+        '''
+        Лента пополняется при публикации и подписке,
+        очищается при отписке и пересобирается командой.
+        '''
+        old_post = Post.objects.create(text='Старый пост', author=self.user1)
+        self.authorized_client2.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user1.username},
+        ))
+        new_post = Post.objects.create(text='Новый пост', author=self.user1)
+        timeline = TimelineEntry.objects.filter(user=self.user2)
+        self.assertEqual(
+            [entry.post for entry in timeline.all()], [new_post, old_post]
+        )
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(timeline.count(), 2)
+        self.authorized_client2.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.user1.username},
+        ))
+        self.assertFalse(timeline.exists())
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_timeline_trim(self):
+        '''Команда с --trim-only оставляет TIMELINE_LENGTH записей.'''
+        Follow.objects.create(user=self.user2, author=self.user1)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.user1)
+            for i in range(5)
+        ]
+        call_command(
+            'rebuild_timelines', '--trim-only', stdout=StringIO()
+        )
+        response = self.authorized_client2.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), posts[:1:-1]
+        )
+
+    @override_settings(TIMELINE_LENGTH=3, TIMELINE_TRIM_EVERY=2)
+    def test_timeline_trimmed_on_fan_out(self):
+        '''Раскладка сама обрезает ленту, не давая ей расти без предела.'''
+        Follow.objects.create(user=self.user2, author=self.user1)
+        for i in range(20):
+            Post.objects.create(text=f'Пост {i}', author=self.user1)
+        self.assertLessEqual(
+            TimelineEntry.objects.filter(user=self.user2).count(), 4
+        )
+
+    @override_settings(FEED_PUSH_FOLLOWER_LIMIT=2, FEED_PUSH_RESUME_LIMIT=2)
+    def test_popular_author_posts_pulled_on_read(self):
+        '''
+        Посты автора с числом подписчиков выше порога не раскладываются
+        по лентам, но видны подписчикам; при падении ниже порога
+        возврата их раскладывает оставшимся подписчикам команда
+        rebuild_timelines, а не запрос отписки.
+        '''
+        user3 = User.objects.create_user(username='test3')
+        Follow.objects.create(user=self.user2, author=self.user1)
+        Follow.objects.create(user=user3, author=self.user1)
+        post = Post.objects.create(text='Популярный пост', author=self.user1)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client2.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+        Follow.objects.filter(user=user3).delete()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client2.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+        call_command('rebuild_timelines', '--trim-only', stdout=StringIO())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user2, post=post).exists()
+        )
+        response = self.authorized_client2.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    @override_settings(FEED_PUSH_FOLLOWER_LIMIT=2, FEED_PUSH_RESUME_LIMIT=1)
+    def test_pull_switch_hysteresis(self):
+        '''Автор между порогами остаётся читаемым при чтении.'''
+        user3 = User.objects.create_user(username='test3')
+        Follow.objects.create(user=self.user2, author=self.user1)
+        Follow.objects.create(user=user3, author=self.user1)
+        Follow.objects.filter(user=user3).delete()
+        call_command('rebuild_timelines', '--trim-only', stdout=StringIO())
+        post = Post.objects.create(text='Пост', author=self.user1)
+        Follow.objects.create(user=user3, author=self.user1)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client2.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
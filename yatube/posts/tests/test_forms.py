@@ -1,6 +1,9 @@
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 
 from ..models import Post, Group
 
@@ -103,3 +106,62 @@ class PostCreateFormTests(TestCase):
             response = guest_client.post(adress, data=form_data, follow=True)
             self.assertRedirects(response, redir)
             self.assertEqual(Post.objects.count(), post_count)
+
+
+class GroupChoicesCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def group_queries(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = method(*args, **kwargs)
+        sql = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_group"' in query['sql']
+        ]
+        return response, sql
+
+    def test_form_does_not_query_groups(self):
+        '''Показ и отправка формы берут группы из кеша.'''
+        url = reverse('posts:post_create')
+        self.authorized_client.get(url)
+        response, sql = self.group_queries(self.authorized_client.get, url)
+        self.assertEqual(sql, [])
+        self.assertContains(response, self.group.title)
+        response, sql = self.group_queries(
+            self.authorized_client.post, url,
+            {'text': 'Текст', 'group': self.group.pk},
+        )
+        self.assertEqual(sql, [])
+        self.assertTrue(Post.objects.filter(group=self.group).exists())
+
+    def test_choices_follow_group_changes(self):
+        '''Новая группа появляется в форме, удалённую выбрать нельзя.'''
+        url = reverse('posts:post_create')
+        self.authorized_client.get(url)
+        new_group = Group.objects.create(
+            title='Новая группа', slug='new', description='-'
+        )
+        self.assertContains(self.authorized_client.get(url), 'Новая группа')
+        pk = new_group.pk
+        new_group.delete()
+        response = self.authorized_client.post(
+            url, {'text': 'Текст', 'group': pk}
+        )
+        self.assertFormError(
+            response, 'form', 'group',
+            'Выберите корректный вариант. Вашего варианта нет среди '
+            'допустимых значений.',
+        )
@@ -0,0 +1,143 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import search
+from ..counters import user_stats
+from ..models import (
+    Comment, Follow, Group, ImportCheckpoint, Post, TimelineEntry,
+)
+
+User = get_user_model()
+
+
+class ImportContentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, *lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        return path
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_content', *args, '--batch-size', '2',
+            stdout=out, stderr=err,
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_posts_and_comments(self):
+        '''Импорт чинит счётчики, ленты и поиск и связывает комментарии.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        records = (
+            {'id': 'a', 'author': 'author', 'text': 'Старая прогулка',
+             'group': 'group', 'pub_date': '2015-05-01T10:00:00'},
+            {'id': 'b', 'author': 'author', 'text': 'Второй пост'},
+            {'id': 'c', 'author': 'nobody', 'text': 'Чужой пост'},
+            {'id': 'd', 'author': 'author', 'text': 'Без группы',
+             'group': 'missing'},
+        )
+        posts = self.write(
+            'posts.ndjson', *map(json.dumps, records), '{broken'
+        )
+        out, err = self.run_import('posts', posts)
+        self.assertIn('Импортировано записей: 2, пропущено: 3', out)
+        self.assertIn("запись 3: нет пользователя 'nobody'", err)
+        old = Post.objects.get(text='Старая прогулка')
+        self.assertEqual(old.group, self.group)
+        self.assertEqual(
+            old.pub_date,
+            timezone.make_aware(datetime(2015, 5, 1, 10)),
+        )
+        self.assertEqual(user_stats(self.author.pk).posts_count, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(search.ranked_post_ids('прогулки'), [old.pk])
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+        comments = self.write(
+            'comments.csv', 'post,author,text',
+            'a,reader,Отличная прогулка', 'a,reader,Согласен',
+            'c,reader,Пост не импортирован',
+        )
+        out, _ = self.run_import('comments', comments, '--source-ids')
+        self.assertIn('Импортировано записей: 2, пропущено: 1', out)
+        old.refresh_from_db()
+        self.assertEqual(old.comments_count, 2)
+        self.assertEqual(
+            Comment.objects.filter(post=old, author=self.reader).count(), 2
+        )
+
+    def test_follows(self):
+        '''Повторные подписки и подписки на себя пропускаются.'''
+        Post.objects.create(text='Пост', author=self.author)
+        follows = self.write(
+            'follows.csv', 'user,author',
+            'reader,author', 'reader,author', 'author,author',
+        )
+        out, _ = self.run_import('follows', follows)
+        self.assertIn('Импортировано записей: 1, пропущено: 2', out)
+        self.assertEqual(user_stats(self.author.pk).followers_count, 1)
+        self.assertEqual(user_stats(self.reader.pk).following_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 1
+        )
+
+    def test_resume_from_checkpoint(self):
+        '''После сбоя импорт продолжается с сохранённой позиции.'''
+        posts = self.write(
+            'posts.ndjson',
+            *(
+                json.dumps({'author': 'author', 'text': f'Пост {n}'})
+                for n in range(3)
+            ),
+        )
+        ImportCheckpoint.objects.create(
+            name=os.path.abspath(posts), kind='posts', position=2
+        )
+        out, _ = self.run_import('posts', posts)
+        self.assertIn('Продолжение с записи 3', out)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Пост 2']
+        )
+
+    def test_repeated_import_skips_known_posts(self):
+        '''Посты с уже сохранённым id источника не импортируются снова.'''
+        posts = self.write(
+            'posts.ndjson',
+            *(
+                json.dumps({'id': n, 'author': 'author', 'text': f'Пост {n}'})
+                for n in range(3)
+            ),
+            json.dumps({'author': 'author', 'text': 'Без id'}),
+        )
+        self.run_import('posts', posts)
+        out, _ = self.run_import('posts', posts)
+        self.assertIn('Импортировано записей: 1, пропущено: 3', out)
+        self.assertEqual(
+            Post.objects.filter(text='Пост 0').count(), 1
+        )
@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, Group
+from ..services import (
+    COUNT_CACHED, COUNT_NONE, ELLIPSIS, FeedPaginator, cached_count,
+    decode_cursor, elided_page_range, encode_cursor
+)
+
+User = get_user_model()
+
+
+class CursorPagingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.test_user = User.objects.create_user(
+            username='test1',
+            email='test@test.ru',
+            password='testpwd',
+        )
+        Post.objects.bulk_create(
+            Post(
+                text=f'Тест пост №{i+1}',
+                author=cls.test_user,
+                group=cls.group,
+            )
+            for i in range(23)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_cursor_round_trip(self):
+        '''Токен курсора декодируется обратно в (pub_date, id).'''
+        post = Post.objects.first()
+        self.assertEqual(
+            decode_cursor(encode_cursor(post)), (post.pub_date, post.pk)
+        )
+        self.assertIsNone(decode_cursor('не-токен'))
+
+    def test_cursor_walks_all_posts(self):
+        '''Переходы по ?after= и ?before= обходят ленту без пропусков.'''
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        seen = []
+        pages = []
+        page = self.guest_client.get(url).context['page_obj']
+        while True:
+            pages.append(page)
+            seen.extend(page.object_list)
+            if not page.has_next():
+                break
+            page = self.guest_client.get(
+                url, {'after': page.next_cursor}
+            ).context['page_obj']
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(p) for p in pages], [10, 10, 3])
+        back = self.guest_client.get(
+            url, {'before': pages[-1].previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(back.object_list, pages[-2].object_list)
+        self.assertTrue(back.has_previous())
+
+    def test_page_number_fallback(self):
+        '''Старые ссылки ?page= продолжают работать.'''
+        url = reverse('posts:index')
+        page = self.guest_client.get(url, {'page': 3}).context['page_obj']
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 3)
+
+    def test_elided_page_range(self):
+        '''Навигация показывает края и окно вокруг текущей страницы.'''
+        self.assertEqual(
+            elided_page_range(10, 5000),
+            [1, ELLIPSIS, 8, 9, 10, 11, 12, ELLIPSIS, 5000],
+        )
+        self.assertEqual(elided_page_range(2, 3), [1, 2, 3])
+        url = reverse('posts:profile', kwargs={'username': 'test1'})
+        page = self.guest_client.get(url, {'page': 1}).context['page_obj']
+        self.assertEqual(page.elided_range, [1, 2, 3])
+
+
+class FeedPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_user = User.objects.create_user(username='test1')
+        Post.objects.bulk_create(
+            Post(text=f'Тест пост №{i+1}', author=cls.test_user)
+            for i in range(23)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_no_count_strategy(self):
+        '''Режим без подсчёта выбирает страницу одним запросом.'''
+        paginator = FeedPaginator(Post.objects.all(), 10, count=COUNT_NONE)
+        with self.assertNumQueries(1):
+            page = paginator.get_page(3)
+            self.assertEqual(len(page), 3)
+            self.assertFalse(page.has_next())
+            self.assertTrue(page.has_previous())
+        with self.assertNumQueries(1):
+            self.assertTrue(paginator.get_page(2).has_next())
+        self.assertEqual(paginator.get_page(10).number, 1)
+
+    def test_cached_count_invalidated_on_save(self):
+        '''Закешированный счётчик сбрасывается при создании поста.'''
+        post_list = self.test_user.posts.all()
+        paginator = FeedPaginator(
+            post_list, 10, count=COUNT_CACHED,
+            feed='profile', pk=self.test_user.pk,
+        )
+        self.assertEqual(paginator.count, 23)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                cached_count(post_list, 'profile', self.test_user.pk), 23
+            )
+        Post.objects.create(text='Новый пост', author=self.test_user)
+        self.assertEqual(
+            cached_count(post_list, 'profile', self.test_user.pk), 24
+        )
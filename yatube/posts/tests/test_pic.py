@@ -1,8 +1,17 @@
+import hashlib
+import os
 import shutil
 import tempfile
+import time
 
+from .. import thumbnails
 from ..models import Post, Group
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from io import StringIO
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
@@ -66,12 +75,14 @@ class ContextContainsPicTests(TestCase):
             reverse('posts:post_create'), data=form_data, follow=True
         )
         self.assertEqual(Post.objects.count(), post_count + 1)
+        # файл лежит в подкаталогах из хеша содержимого
+        digest = hashlib.sha1(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 text=form_data['text'],
                 group=form_data['group'],
                 author=self.test_user,
-                image='posts/small.gif',
+                image=f'posts/{digest[:2]}/{digest[2:4]}/small.gif',
             ).exists()
         )
         new_post = Post.objects.all()[0]
@@ -86,3 +97,127 @@ class ContextContainsPicTests(TestCase):
         for adress in adress_list:
             response = self.authorized_client.get(adress)
             self.assertContains(response, '<img')
+
+    def test_thumbnail_prepared_in_background(self):
+        '''
+        Пока миниатюра не готова, страница показывает заглушку и не
+        создаёт её сама; после фоновой обработки - готовую миниатюру.
+        '''
+        cache.clear()
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.test_user,
+            image=SimpleUploadedFile('bg.gif', small_gif, 'image/gif'),
+        )
+        self.assertIn(post.image.name, thumbnails._pending)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'data:image/svg+xml')
+        thumbnails.generate(post.image.name)
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, 'data:image/svg+xml')
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+        for width in thumbnails.WIDTHS:
+            self.assertContains(response, f' {width}w')
+        self.assertContains(response, f"sizes='{thumbnails.SIZES}'")
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_failed_thumbnail_not_rescheduled(self):
+        '''
+        Сломанная картинка не отдаётся в пул при каждом показе: её имя
+        остаётся в очереди до истечения PENDING_TTL.
+        '''
+        name = 'posts/missing.gif'
+        queued = time.monotonic()
+        thumbnails._pending[name] = queued
+        self.addCleanup(thumbnails._pending.pop, name, None)
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails._submit(name)
+        thumbnails.schedule(name)
+        self.assertEqual(thumbnails._pending.get(name), queued)
+
+    def test_page_thumbnails_fetched_in_one_batch(self):
+        '''Миниатюры всей страницы ленты читаются одним запросом.'''
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        for i in range(5):
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=self.test_user,
+                image=SimpleUploadedFile(f'{i}.gif', small_gif, 'image/gif'),
+            )
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertNotContains(response, 'data:image/svg+xml')
+
+    def test_image_preview_saved_with_upload(self):
+        '''
+        Форма сохраняет превью картинки, а команда describe_images
+        дописывает его старым постам.
+        '''
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с превью',
+            'image': SimpleUploadedFile('meta.gif', small_gif, 'image/gif'),
+        })
+        post = Post.objects.get(text='Пост с превью')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        old = Post.objects.create(
+            text='Старый пост', author=self.test_user, image=post.image.name
+        )
+        call_command('describe_images', stdout=StringIO())
+        old.refresh_from_db()
+        self.assertEqual(old.image_placeholder, post.image_placeholder)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': old.pk})
+        )
+        self.assertContains(response, post.image_placeholder)
+
+    def test_shard_media_moves_flat_files(self):
+        '''shard_media переносит старые файлы в подкаталоги по хешу.'''
+        content = b'GIF89a-flat'
+        flat_path = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'flat.gif')
+        os.makedirs(os.path.dirname(flat_path), exist_ok=True)
+        with open(flat_path, 'wb') as file:
+            file.write(content)
+        post = Post.objects.create(
+            text='Старый пост', author=self.test_user, image='posts/flat.gif'
+        )
+        call_command('shard_media', stdout=StringIO())
+        post.refresh_from_db()
+        digest = hashlib.sha1(content).hexdigest()
+        self.assertEqual(
+            post.image.name, f'posts/{digest[:2]}/{digest[2:4]}/flat.gif'
+        )
+        self.assertEqual(post.image.read(), content)
+        self.assertFalse(os.path.exists(flat_path))
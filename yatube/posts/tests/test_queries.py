@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryCountTests(TestCase):
+    '''
+    Число запросов на страницу ленты не должно зависеть от числа
+    постов: всё, что читает шаблон, выбирается заранее.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            Post.objects.create(
+                text=f'Тест пост №{i+1}', author=cls.author, group=cls.group
+            )
+        cls.post = Post.objects.first()
+        for i in range(12):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Коммент {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_public_pages_query_count(self):
+        '''Публичные ленты выполняют фиксированное число запросов.'''
+        pages = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}): 2,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): 3,
+            # ETag страницы поста, пост, счётчики, комментарии
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): 4,
+        }
+        for url, queries in pages.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    self.guest_client.get(url)
+
+    def test_follow_index_query_count(self):
+        '''Лента подписок выполняет фиксированное число запросов.'''
+        self.authorized_client.get(reverse('posts:follow_index'))
+        # сессия, пользователь, лента
+        with self.assertNumQueries(3):
+            self.authorized_client.get(reverse('posts:follow_index'))
@@ -0,0 +1,157 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post, SearchTerm
+from ..stemmer import stem
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.post = Post.objects.create(
+            text='Утренняя прогулка по набережной', author=cls.author
+        )
+        cls.other = Post.objects.create(
+            text='Рецепт пирога с яблоками', author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_index_follows_changes(self):
+        '''Индекс видит новые, изменённые и удалённые тексты.'''
+        comment = Comment.objects.create(
+            post=self.other, author=self.author, text='Прогулка удалась'
+        )
+        self.assertEqual(
+            search.ranked_post_ids('прогулка'), [self.post.pk, self.other.pk]
+        )
+        self.post.text = 'Вечерний пирог'
+        self.post.save()
+        comment.delete()
+        self.assertEqual(search.ranked_post_ids('прогулка'), [])
+        self.assertEqual(
+            set(search.ranked_post_ids('пирог')),
+            {self.post.pk, self.other.pk},
+        )
+        # индекс слов для админки держат триггеры
+        Post.objects.filter(pk=self.post.pk).update(text='Гроза')
+        self.assertEqual(
+            list(search.filter_matching(Post.objects.all(), 'гроз')),
+            [self.post],
+        )
+
+    def test_inflected_forms_and_typos(self):
+        '''Находятся другие формы слова и слова с опечатками.'''
+        queries = (
+            'прогулками', 'набережная', 'прогулкой по набережной',
+            'прогулкаа', 'набережнй', 'утреняя прагулка',
+        )
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertEqual(
+                    search.ranked_post_ids(query), [self.post.pk]
+                )
+        self.assertEqual(search.ranked_post_ids('пирог прогулка'), [])
+
+    def test_stemmer(self):
+        '''Формы слова сводятся к одной основе.'''
+        forms = {
+            'прогулк': ('прогулка', 'прогулки', 'прогулкой'),
+            'пирог': ('пирога', 'пироги', 'пирогами'),
+            'важн': ('важная', 'важнейшие'),
+            'елк': ('ёлки', 'елками'),
+        }
+        for base, words in forms.items():
+            for word in words:
+                with self.subTest(word=word):
+                    self.assertEqual(stem(word), base)
+
+    def test_rebuild(self):
+        '''Перестройка индексирует тексты, изменённые без сигналов.'''
+        Post.objects.filter(pk=self.other.pk).update(text='Грозовые тучи')
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('посты: 2', out.getvalue())
+        self.assertEqual(search.ranked_post_ids('грозовой'), [self.other.pk])
+        self.assertFalse(SearchTerm.objects.filter(text='пирог').exists())
+
+    def test_rebuild_commits_per_chunk(self):
+        '''Перестройка не держит одну транзакцию на все записи.'''
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                'rebuild_search_index', '--chunk-size', '1', stdout=StringIO()
+            )
+        savepoints = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SAVEPOINT')
+        ]
+        self.assertEqual(len(savepoints), Post.objects.count())
+        self.assertEqual(
+            search.ranked_post_ids('прогулка'), [self.post.pk]
+        )
+
+    def test_index_restored_after_migrate(self):
+        '''Пропавшие триггеры создаются заново, индекс перестраивается.'''
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_ai')
+        Post.objects.create(text='Прогулка без индекса', author=self.author)
+        search.install()
+        self.assertEqual(
+            search.filter_matching(Post.objects.all(), 'прогулка').count(), 2
+        )
+
+    def test_operators_are_plain_words(self):
+        '''Синтаксис FTS5 в запросе не ломает поиск.'''
+        for query in ('NEAR(" OR', 'пирог*"', '***'):
+            with self.subTest(query=query):
+                self.client.get(reverse('posts:search'), {'q': query})
+        # OR - обычное слово, которого нет ни в одном тексте
+        self.assertEqual(
+            search.ranked_post_ids('"пирог" OR'), [self.other.pk]
+        )
+
+    @override_settings(MAX_POSTS_IN_PAGE=2)
+    def test_search_page(self):
+        '''Страница поиска ранжирует результаты и листается с запросом.'''
+        for n in range(3):
+            Post.objects.create(text=f'Пирог номер {n}', author=self.author)
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'пирог'})
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 4)
+        self.assertEqual(len(page), 2)
+        self.assertContains(response, '?q=%D0%BF%D0%B8%D1%80%D0%BE%D0%B3&amp;')
+        response = self.client.get(url, {'q': 'пирог', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertNotIn('page_obj', self.client.get(url).context)
+
+    def test_admin_uses_index(self):
+        '''Поиск в админке идёт по индексу, а не по LIKE.'''
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'набережн'}
+            )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post]
+        )
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
@@ -34,6 +34,7 @@ class ViewTests(TestCase):
         Post.objects.bulk_create(test_posts)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = self.test_user
         self.authorized_client = Client()
@@ -0,0 +1,308 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import quote
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+from PIL import features
+
+from .models import Post
+
+logger = logging.getLogger('posts.thumbnails')
+
+# варианты миниатюры, которые показывают шаблоны posts/ через
+# {% post_thumbnail %}: кадр 960x339 в нескольких ширинах, в формате
+# sorl по умолчанию и в WebP, если Pillow его поддерживает. Все они
+# готовятся заранее после загрузки
+RATIO = (960, 339)
+WIDTHS = (480, 960, 1440)
+BASE_WIDTH = 960
+OPTIONS = {'crop': 'center', 'upscale': True}
+FORMATS = (None, 'WEBP') if features.check('webp') else (None,)
+VARIANTS = tuple((fmt, width) for fmt in FORMATS for width in WIDTHS)
+# ширина карточки на странице: колонка контейнера bootstrap или экран
+SIZES = '(min-width: 992px) 960px, 100vw'
+
+PLACEHOLDER_SVG = (
+    "<svg xmlns='http://www.w3.org/2000/svg' width='{0}' height='{1}' "
+    "viewBox='0 0 {0} {1}'><rect width='100%' height='100%' "
+    "fill='#e9ecef'/></svg>"
+)
+
+_executor = None
+_processes = None
+# имя -> время постановки в очередь; запись без ответа дольше
+# PENDING_TTL (транзакцию откатили, процесс пула упал) ставится снова
+_pending = {}
+PENDING_TTL = 60
+_lock = threading.Lock()
+
+
+def geometry(width):
+    return '{}x{}'.format(width, round(width * RATIO[1] / RATIO[0]))
+
+
+def variant_options(fmt):
+    return dict(OPTIONS, format=fmt) if fmt else OPTIONS
+
+
+class Placeholder:
+    '''
+    Заглушка размера миниатюры, пока та не готова: сохранённое превью
+    картинки (Post.image_placeholder) или серый прямоугольник.
+    '''
+    srcset = webp_srcset = sizes = placeholder = ''
+
+    def __init__(self, preview=''):
+        self.width, self.height = RATIO
+        self.url = preview or 'data:image/svg+xml,' + quote(
+            PLACEHOLDER_SVG.format(self.width, self.height)
+        )
+
+
+class Picture:
+    '''
+    Основная миниатюра и srcset из готовых вариантов; placeholder -
+    превью, которое видно, пока грузится сама миниатюра.
+    '''
+    sizes = SIZES
+
+    def __init__(self, variants, preview=''):
+        self.placeholder = preview
+        main = variants[None, BASE_WIDTH]
+        self.url, self.width, self.height = main.url, main.width, main.height
+        self.srcset = self._srcset(variants, None)
+        self.webp_srcset = self._srcset(variants, 'WEBP')
+
+    @staticmethod
+    def _srcset(variants, fmt):
+        return ', '.join(
+            f'{variants[fmt, width].url} {variants[fmt, width].width}w'
+            for width in WIDTHS if (fmt, width) in variants
+        )
+
+
+class LookupBackend(ThumbnailBackend):
+    def options(self, source, options):
+        # те же параметры по умолчанию, что и в get_thumbnail(), иначе
+        # имя миниатюры не совпадёт с созданной
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self.options(source, options)
+        )
+        return ImageFile(name, default.storage)
+
+    def lookup_many(self, items):
+        '''
+        Готовые миниатюры для списка (файл, геометрия, параметры) или
+        None, без создания файлов: одно чтение кеша kvstore и один
+        запрос к таблице kvstore на все промахи кеша.
+        '''
+        thumbs = [
+            self.thumbnail_file(file_, geometry_string, options)
+            for file_, geometry_string, options in items
+        ]
+        kvstore = default.kvstore
+        if not thumbs:
+            return []
+        if not isinstance(kvstore, CachedDBStore):
+            return [kvstore.get(thumb) for thumb in thumbs]
+        keys = [add_prefix(thumb.key) for thumb in thumbs]
+        values = kvstore.cache.get_many(keys)
+        missing = [key for key in set(keys) if key not in values]
+        if missing:
+            # как в cached_db_kvstore: отсутствие тоже кешируется
+            found = dict.fromkeys(missing, EMPTY_VALUE)
+            found.update(KVStore.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            kvstore.cache.set_many(
+                found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(found)
+        return [
+            None if values[key] == EMPTY_VALUE
+            else deserialize_image_file(values[key])
+            for key in keys
+        ]
+
+
+backend = LookupBackend()
+
+
+def _pictures(images):
+    '''
+    Picture для каждого изображения, если готова основная миниатюра,
+    иначе заглушка. Недостающие варианты ставятся в очередь: рендер
+    страницы никогда не ждёт обработки изображения.
+    '''
+    found = iter(backend.lookup_many([
+        (image, geometry(width), variant_options(fmt))
+        for image in images for fmt, width in VARIANTS
+    ]))
+    pictures = []
+    for image in images:
+        variants = {
+            variant: thumb for variant, thumb in zip(VARIANTS, found)
+            if thumb
+        }
+        if len(variants) < len(VARIANTS):
+            schedule(image.name)
+        # превью сохранено в посте, файл картинки не открывается
+        preview = getattr(image.instance, 'image_placeholder', '')
+        if (None, BASE_WIDTH) in variants:
+            pictures.append(Picture(variants, preview))
+        else:
+            pictures.append(Placeholder(preview))
+    return pictures
+
+
+def thumbnail(image):
+    '''Миниатюра для шаблона: Picture или заглушка.'''
+    if not image:
+        return None
+    return _pictures([image])[0]
+
+
+def prefetch(posts):
+    '''
+    Кладёт в post.thumbnail миниатюры всех постов страницы, найденные
+    одним пакетным чтением kvstore, чтобы шаблоны не ходили в него
+    за каждой картинкой.
+    '''
+    posts = list(posts)
+    with_image = [post for post in posts if post.image]
+    for post in posts:
+        post.thumbnail = None
+    pictures = _pictures([post.image for post in with_image])
+    for post, picture in zip(with_image, pictures):
+        post.thumbnail = picture
+    return posts
+
+
+def render_variants(name):
+    '''Создаёт все варианты миниатюры. Выполняется в пуле процессов.'''
+    for fmt, width in VARIANTS:
+        thumb = default.backend.get_thumbnail(
+            name, geometry(width), **variant_options(fmt)
+        )
+        # sorl не бросает исключение, если исходник не открылся, а
+        # возвращает миниатюру, которой нет в kvstore
+        if not default.kvstore.get(thumb):
+            raise OSError(f'миниатюра {geometry(width)} не создана')
+    return name
+
+
+def try_render_variants(name):
+    '''render_variants для пакетной обработки: ошибка не прерывает пул.'''
+    try:
+        render_variants(name)
+    except Exception as error:
+        return name, repr(error)
+    return name, None
+
+
+def refresh_posts(name):
+    # сохранение обновляет updated_at, а сигнал сбрасывает ленты, так
+    # что закешированные карточки с заглушкой перерисуются
+    for post in Post.objects.filter(image=name).select_related('author'):
+        post.save(update_fields=['updated_at'])
+
+
+def generate(name):
+    '''Создаёт все миниатюры изображения и сбрасывает карточки постов.'''
+    render_variants(name)
+    refresh_posts(name)
+
+
+def process_pool(max_workers=None):
+    '''
+    Пул процессов для обработки изображений. Процессы запускаются через
+    spawn (веб-процесс многопоточный, fork в нём небезопасен) и
+    настраивают django сами.
+    '''
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def _done(name):
+    # после ошибки имя остаётся в _pending до истечения PENDING_TTL:
+    # иначе каждый показ страницы со сломанной картинкой снова отдавал
+    # бы её в пул
+    with _lock:
+        _pending.pop(name, None)
+
+
+def _work(name):
+    global _processes
+    try:
+        with _lock:
+            if _processes is None:
+                _processes = process_pool(settings.THUMBNAIL_PROCESSES)
+        # поток пула лишь ждёт процесс с Pillow и сбрасывает карточки
+        _processes.submit(render_variants, name).result()
+        refresh_posts(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', name)
+    else:
+        _done(name)
+    finally:
+        # поток пула держит собственные соединения с БД
+        connections.close_all()
+
+
+def _submit(name):
+    global _executor
+    if not settings.THUMBNAIL_ASYNC:
+        try:
+            generate(name)
+        except Exception:
+            logger.exception('Не удалось создать миниатюры %s', name)
+        else:
+            _done(name)
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    _executor.submit(_work, name)
+
+
+def schedule(name):
+    '''Ставит создание миниатюр в фоновый пул после фиксации транзакции.'''
+    now = time.monotonic()
+    with _lock:
+        if now - _pending.get(name, -PENDING_TTL) < PENDING_TTL:
+            return
+        _pending[name] = now
+    transaction.on_commit(lambda: _submit(name))
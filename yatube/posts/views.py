@@ -1,28 +1,43 @@
+from functools import partial
+from urllib.parse import urlencode
+
 from django.shortcuts import render, get_object_or_404
 from .models import Post, Group, Follow, User
 from django.contrib.auth.decorators import login_required
 from .forms import PostForm, CommentForm
 from django.shortcuts import redirect
-from .services import paging
-from django.views.decorators.cache import cache_page
-
-
-@cache_page(20, key_prefix='index_page')
+from .services import comment_feed, paging, post_feed
+from .search import search_page
+from . import counters, feeds
+from .caching import (
+    attach_cards, cache_feed, conditional, feed_etag, post_etag,
+)
+from core.middleware.query_budget import query_budget
+
+
+@query_budget(queries=4, time_ms=100)
+@conditional(feed_etag('index'))
+@cache_feed('index')
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    page_obj = paging(request, post_list)
+    post_list = post_feed()
+    page_obj = paging(request, post_list, feed='index')
+    attach_cards(page_obj)
     context = {
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@query_budget(queries=5, time_ms=100)
+@conditional(feed_etag('group', kwarg='slug'))
+@cache_feed('group', kwarg='slug')
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = paging(request, post_list)
+    post_list = post_feed(group.posts.all())
+    page_obj = paging(request, post_list, feed='group', pk=group.pk)
+    attach_cards(page_obj, 'posts/includes/group_post.html')
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -30,12 +45,19 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(queries=7, time_ms=100)
+@conditional(feed_etag('profile', kwarg='username'))
+@cache_feed('profile', kwarg='username')
 def profile(request, username):
     template = 'posts/profile.html'
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    post_count = post_list.count()
-    page_obj = paging(request, post_list)
+    post_list = post_feed(author.posts.all())
+    stats = counters.user_stats(author.pk)
+    page_obj = paging(
+        request, post_list, feed='profile', pk=author.pk,
+        total=stats.posts_count,
+    )
+    attach_cards(page_obj, 'posts/includes/profile_post.html')
     current_user = request.user
     is_following = current_user.is_authenticated and Follow.objects.filter(
         user=current_user,
@@ -44,21 +66,24 @@ def profile(request, username):
     context = {
         'author': author,
         'page_obj': page_obj,
-        'post_count': post_count,
+        'post_count': stats.posts_count,
+        'stats': stats,
         'following': is_following,
     }
     return render(request, template, context)
 
 
+@query_budget(queries=8, time_ms=100)
+@conditional(post_etag)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    article = get_object_or_404(
-        Post.objects.select_related('author'), pk=post_id
-    )
-    post_count = article.author.posts.count()
+    article = get_object_or_404(post_feed(), pk=post_id)
+    post_count = counters.user_stats(article.author_id).posts_count
     form = CommentForm()
-    comment_list = article.comments.all().order_by('-pub_date')
-    comments = paging(request, comment_list)
+    comment_list = comment_feed(article.comments.order_by('-pub_date'))
+    comments = paging(
+        request, comment_list, feed='comments', total=article.comments_count
+    )
     context = {
         'article': article,
         'post_count': post_count,
@@ -68,6 +93,23 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+@query_budget(queries=6, time_ms=100)
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        # ссылки пагинатора сохраняют запрос
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    if query:
+        page_obj = search_page(request, query)
+        attach_cards(page_obj)
+        context['page_obj'] = page_obj
+    return render(request, template, context)
+
+
+@query_budget(queries=20, time_ms=200)
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -82,6 +124,7 @@ def post_create(request):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(queries=20, time_ms=200)
 @login_required
 def post_edit(request, post_id):
     edit_post = get_object_or_404(Post, id=post_id)
@@ -101,6 +144,7 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(queries=8, time_ms=100)
 @login_required
 def add_comment(request, post_id):
     post = Post.objects.get(id=post_id)
@@ -113,25 +157,29 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(queries=6, time_ms=100)
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
     current_user = request.user
-    post_list = Post.objects.filter(
+    post_list = post_feed(Post.objects.filter(
         author__following__user=current_user
+    ))
+    # post_list нужен только для старых ссылок ?page=, курсорные
+    # страницы собираются из ленты TimelineEntry и постов популярных
+    # авторов (см. posts.feeds)
+    feed_paginator = partial(feeds.FollowFeedPaginator, user=current_user)
+    paginator = paging(
+        request, post_list, feed='follow', cursor_paginator=feed_paginator
     )
-    # 1) ищет всех user = текущему юзеру
-    # 2) ищет все объекты Follow которые ссылаются на user через related_name
-    # following
-    # 3) ищет всех авторов от полученных объектов Follow
-    # 4) фильтрует по автору
-    paginator = paging(request, post_list)
+    attach_cards(paginator)
     context = {
         'page_obj': paginator,
     }
     return render(request, template, context)
 
 
+@query_budget(queries=20, time_ms=200)
 @login_required
 def profile_follow(request, username):
     current_user = request.user
@@ -145,6 +193,7 @@ def profile_follow(request, username):
     return redirect('posts:profile', username=username)
 
 
+@query_budget(queries=20, time_ms=200)
 @login_required
 def profile_unfollow(request, username):
     current_user = request.user
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -103,14 +104,96 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 MAX_POSTS_IN_PAGE = 10
+TIMELINE_LENGTH = 1000
+TIMELINE_BATCH_SIZE = 500
+# ленты обрезаются до TIMELINE_LENGTH при раскладке примерно раз
+# в столько вставок в ленту читателя (posts.feeds.fan_out_posts)
+TIMELINE_TRIM_EVERY = 100
+# автор с FEED_PUSH_FOLLOWER_LIMIT подписчиков читается при чтении лент,
+# обратно к раскладке возвращается при FEED_PUSH_RESUME_LIMIT - 1
+FEED_PUSH_FOLLOWER_LIMIT = 1000
+FEED_PUSH_RESUME_LIMIT = 800
+FEED_HEAVY_AUTHORS_TTL = 60
+# способ подсчёта записей для ссылок ?page=: exact, cached или none
+PAGINATOR_COUNT = {
+    'index': 'none',
+    'group': 'none',
+    'profile': 'cached',
+    'follow': 'none',
+    'comments': 'exact',
+}
+PAGINATOR_COUNT_TTL = 60 * 60
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+POST_CARD_TIMEOUT = 60 * 60 * 24
+# список групп для формы поста (posts.services.cached_groups)
+GROUPS_CACHE_TIMEOUT = 60 * 60
+# поиск (posts.search): сколько лучших результатов листать и вес
+# совпадения в комментарии относительно совпадения в тексте поста
+SEARCH_MAX_RESULTS = 500
+SEARCH_COMMENT_WEIGHT = 0.5
+# опечатки: неизвестная основа заменяется SEARCH_FUZZY_TERMS похожими
+# из SEARCH_FUZZY_CANDIDATES кандидатов по триграммам; в основах от
+# SEARCH_TWO_TYPOS_LENGTH символов допускаются две правки, иначе одна
+SEARCH_FUZZY_TERMS = 3
+SEARCH_FUZZY_CANDIDATES = 50
+SEARCH_TWO_TYPOS_LENGTH = 8
+# защита от одновременной пересборки страницы (core.cache.stampede):
+# сколько отдавать устаревшую копию, пока её пересобирает один процесс,
+# сколько ждать владельца блокировки и коэффициент раннего обновления
+CACHE_GRACE_TIME = 60
+CACHE_LOCK_TIMEOUT = 10
+CACHE_EARLY_REFRESH_BETA = 1.0
+# бюджеты запросов к БД по имени view, важнее декоратора query_budget:
+# {'posts:index': {'queries': 5, 'time_ms': 50}}
+QUERY_BUDGETS = {}
+QUERY_BUDGET_RAISE = False
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 # EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# тесты подменяют каталог и для процессов пула миниатюр
+MEDIA_ROOT = os.environ.get(
+    'YATUBE_MEDIA_ROOT', os.path.join(BASE_DIR, 'media')
+)
+# загрузки из этих каталогов раскладываются по подкаталогам из хеша
+# содержимого: posts/ab/cd/photo.jpg
+DEFAULT_FILE_STORAGE = 'core.storage.ShardedStorage'
+MEDIA_SHARDED_DIRS = ('posts/',)
+# миниатюры постов готовятся после загрузки: потоки THUMBNAIL_WORKERS
+# отдают изображения в пул из THUMBNAIL_PROCESSES процессов (None - по
+# числу ядер); THUMBNAIL_ASYNC = False создаёт их сразу после фиксации
+# транзакции. Пул свой у каждого процесса веб-сервера, так что всего
+# процессов с Pillow - число воркеров gunicorn * THUMBNAIL_PROCESSES;
+# массовую обработку делает команда build_thumbnails со своим пулом
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_PROCESSES = 1
+# L1 в памяти процесса перед общим для всех воркеров кешем в файле
+# sqlite (WAL); L1_MAX_AGE - на сколько секунд L1 может отстать от
+# изменений, сделанных другими процессами
+# каталог файла общего кеша; тесты подменяют его временным
+# (core.test_runner), процессы миниатюр получают его через окружение
+CACHE_DIR = os.environ.get('YATUBE_CACHE_DIR', BASE_DIR)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.tiered.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_MAX_BYTES': 32 * 2 ** 20,
+            'L1_MAX_AGE': 1,
+            'COMPRESS_MIN_SIZE': 1024,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'COMPRESS_MIN_SIZE': 1024,
+        },
     }
 }
+# тесты работают со своими временными файлами кешей
+TEST_RUNNER = 'core.test_runner.TestRunner'